@@ -9,10 +9,15 @@
 ;
 ; > vasmm68k_mot -Fbin -DROM_NTSC=1 -o cpubltro-ntsc.rom cpubltro.asm
 ; > vasmm68k_mot -Fbin -DROM_NTSC=0 -o cpubltro-pal.rom cpubltro.asm
+;
+;	ROM_SPRBIN=1 uses the raw sprite data (sprdata.py --binary)
 ;
 	IFND	ROM_NTSC
 ROM_NTSC	EQU	0
 	ENDC
+	IFND	ROM_SPRBIN
+ROM_SPRBIN	EQU	0
+	ENDC
 
 	IDNT	CPUBLTRO_ROM
 
@@ -565,11 +570,19 @@ SprSkip:
 
 
 SprData:
+	IFNE	ROM_SPRBIN
+	IFNE	ROM_NTSC
+	INCBIN	"images/ntscdata.bin"
+	ELSE
+	INCBIN	"images/balldata.bin"
+	ENDC
+	ELSE
 	IFNE	ROM_NTSC
 	INCLUDE	"images/ntscdata.i"
 	ELSE
 	INCLUDE	"images/balldata.i"
 	ENDC
+	ENDC
 	IFNE	(*-SprData)-(2*MY_ANIM_LEN*MY_SPR_SIZE)-(4*7)
 	FAIL	"Unexpected sprite data size, review the data/code."
 	ENDC
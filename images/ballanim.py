@@ -3,102 +3,40 @@
 # not-so-random quote: "get ready to match our spin with the retro thrusters"
 
 import argparse
+import concurrent.futures
+import imgcache
+import io
+import numpy as np
 import os
 import pathlib
 import png
+import pngopt
+import shlex
+import stagetime
 import sys
 
-argp = argparse.ArgumentParser(prog='ballanim.py', add_help=False,
-  usage='python3 %(prog)s (--pal | --ntsc) [--interlaced] [--help | options]',
-  description='Generate ball animation images from greyscale colormap.',
-  allow_abbrev=False)
-argp_mode = argp.add_argument_group('mode')
-argp_ntsc = argp_mode.add_mutually_exclusive_group(required=True)
-argp_ntsc.add_argument('--pal', '-p', action='store_false', dest='ntsc',
-  help='50Hz (6*2 colors * steps/frame)')
-argp_ntsc.add_argument('--ntsc', '-n', action='store_true',
-  help='60Hz (7*2 colors * steps/frame)')
-argp_mode.add_argument('--interlaced', '-i', action='store_true', dest='lace',
-  help='1 step/frame (else progressive)', default=False)
-argp_mode.add_argument('--help', '-h', action='store_true',
-  help='show this help message and exit', default=False)
-args, _ = argp.parse_known_args()
-argp_opts = argp.add_argument_group('options ({0}, {1})'.format(
-  'NTSC' if args.ntsc else 'PAL',
-  'interlaced' if args.lace else 'progressive'))
-BASE_STR = 'ntsc' if args.ntsc else 'ball'
-STEP_LEN = 1 if args.lace else 2 # analog TV frame vs progressive fields
-ANIM_LEN = ((7 if args.ntsc else 6) * 2) * STEP_LEN # 7*50/60/6 = 97.22%
-ANIM_BASE = -2 * STEP_LEN # original demo starts with two steps westward
+base_str = lambda ntsc : 'ntsc' if ntsc else 'ball'
+step_len = lambda lace : 1 if lace else 2 # analog TV frame vs progressive field
+anim_len = lambda ntsc, lace=False : (
+  ((7 if ntsc else 6) * 2) * step_len(lace)) # 7*50/60/6 = 97.22%
+anim_base = lambda lace=False : (
+  -2 * step_len(lace)) # original demo starts with two steps westward
 ROT_FADER = 1 # animation fading steps (original has half the steps = 2)
 IMG_SCALE = 1 # scale output files (no filter, has to be 1 for ROM code)
 NAME_BASE = 0 # (1 makes APNG fallback easier, has to be 0 for ROM code)
-MASK_USED = False # TODO (needs more work to squeeze it into 256 KB ROM)
+# the shadow mask stop frames fit into the 256 KB ROM (full layout PAL
+# 232356, NTSC 224880 bytes, see sprdata.py --long-dict --mask-file), but
+# cpubltro.asm has no stop animation to show them
+MASK_USED = False
 MAKE_EAST = True
 MAKE_STOP = MASK_USED
 MAKE_WEST = True
 BACKWARDS = False
-CMAP_FILE = f'{BASE_STR}cmap.png'
-MASK_FILE = f'{BASE_STR}mask.png' # optional shadow mask
-argp_opts.add_argument('--cmap-file', metavar='.png', type=pathlib.Path,
-  help=f'8-bit greyscale (={CMAP_FILE})', default=CMAP_FILE)
-argp_opts.add_argument('--anim-base', metavar=f'{1-ANIM_LEN}..{ANIM_LEN-1}',
-  help=f'first animation pos (default={ANIM_BASE})', default=ANIM_BASE,
-  type=int, choices=range(1-ANIM_LEN, ANIM_LEN))
-argp_opts.add_argument('--rot-fader', metavar=f'0..{ANIM_LEN // 2}',
-  help=f'rotation fade width (default={ROT_FADER})', default=ROT_FADER,
-  type=int, choices=range(0, (ANIM_LEN // 2) + 1))
-argp_opts.add_argument('--img-scale', '-x', metavar='1..N',
-  help=f'output image scaler (ROMcode={IMG_SCALE})', default=IMG_SCALE,
-  type=lambda x : int(x) if int(x) >= 1 else argp.error('invalid scale'))
-argp_opts.add_argument('--name-base', metavar='0..N',
-  help=f'first output number (ROMcode={NAME_BASE})', default=NAME_BASE,
-  type=lambda x : int(x) if int(x) >= 0 else argp.error('invalid offset'))
-if not MASK_USED:
-  argp_opts.add_argument('--mask-used', action='store_true',
-    help='shadow mask (black: white=fade)', default=False)
-argp_opts.add_argument('--mask-file',  metavar=f'.png', type=pathlib.Path,
-  help=f'1-bit greyscale (={MASK_FILE})', default=MASK_FILE)
-if     MAKE_EAST:
-  argp_opts.add_argument('--skip-east', action='store_true',
-    help='do not generate eastward images', default=False)
-if not MAKE_STOP:
-  argp_opts.add_argument('--make-stop', action='store_true',
-    help='force generating stopped images', default=False)
-if     MAKE_WEST:
-  argp_opts.add_argument('--skip-west', action='store_true',
-    help='do not generate westward images', default=False)
-if not BACKWARDS:
-  argp_opts.add_argument('--backwards', action='store_true',
-    help='backward animation order (west)', default=False)
-args = argp.parse_args()
-if args.help:
-  argp.print_help(sys.stderr)
-  sys.exit(1)
-CMAP_FILE = args.cmap_file
-MASK_FILE = args.mask_file
-ANIM_BASE = args.anim_base
-ROT_FADER = args.rot_fader
-IMG_SCALE = args.img_scale
-NAME_BASE = args.name_base
-if not MASK_USED: MASK_USED =     args.mask_used
-if     MAKE_EAST: MAKE_EAST = not args.skip_east
-if not MAKE_STOP: MAKE_STOP =     args.make_stop or MASK_USED
-if     MAKE_WEST: MAKE_WEST = not args.skip_west
-if not BACKWARDS: BACKWARDS =     args.backwards
-PATH_EXT = ''
-if BACKWARDS : PATH_EXT += 'b'
-if args.lace : PATH_EXT += 'i'
-if IMG_SCALE != 1: PATH_EXT += f'x{IMG_SCALE}'
-if NAME_BASE != 0: PATH_EXT += f'n{NAME_BASE}'
-if PATH_EXT : PATH_EXT = f'-{PATH_EXT}'
 FILE_FRMT = 'image{0:03d}.png'
-EAST_PATH = f'{BASE_STR}east{PATH_EXT}'
-STOP_PATH = f'{BASE_STR}stop{PATH_EXT}'
-WEST_PATH = f'{BASE_STR}west{PATH_EXT}'
-EAST_FRMT = os.path.join(EAST_PATH, FILE_FRMT) if MAKE_EAST else ''
-STOP_FRMT = os.path.join(STOP_PATH, FILE_FRMT) if MAKE_STOP else ''
-WEST_FRMT = os.path.join(WEST_PATH, FILE_FRMT) if MAKE_WEST else ''
+# options of the whole run (only on the command line, not in --batch files)
+RUN_OPTIONS = ('--batch', '--jobs', '-j', '--cache-dir', '--no-cache',
+  '--timings', '--profile')
+CODE_HASH = imgcache.hash_file(__file__)
 
 ocs_to_rgb = lambda c : tuple(((c >> i) & 0x0F) * 0x11 for i in (8, 4, 0))
 palette = (
@@ -107,61 +45,269 @@ palette = (
   (*ocs_to_rgb(0xFDD),  ), # FADE (pink)
   (*ocs_to_rgb(0xFFF),  )) # WHITE
 BACK, RED, FADE, WHITE = range(len(palette))
+EAST, STOP, WEST = range(3)
 # see 'gimp/ballpath.gpl' for details (interlace index //= 2)
-INTENSITY_BASE = (((0xFF * STEP_LEN) // 0x11) + 1) - ANIM_LEN
-intensity_to_index = lambda i : (
-  (((int(i) * STEP_LEN) + (0x11 // 2)) // 0x11) - INTENSITY_BASE)
-index_to_intensity = lambda i : (
-  (((i + INTENSITY_BASE) * 0x11) + (STEP_LEN // 2)) // STEP_LEN)
-black_to_fade_bool = lambda i : False if i else True
-
-width, height, pixels, metadata = png.Reader(filename=CMAP_FILE).read()
-if not metadata['greyscale'] or metadata['bitdepth'] != 8:
-  sys.exit(f'error: {CMAP_FILE:s} has to be a 8-bit grayscale image')
-cmap = tuple(tuple(map(intensity_to_index, row)) for row in pixels)
-if MASK_USED:
-  pixels, metadata = png.Reader(filename=MASK_FILE).read()[2:]
-  if not metadata['greyscale'] or metadata['bitdepth'] != 1:
-    sys.exit(f'error: {MASK_FILE:s} has to be a 1-bit grayscale image')
-  if tuple(metadata['size']) != (width, height):
-    sys.exit(f'error: {MASK_FILE:s} size has to match {CMAP_FILE:s}')
-  fade = tuple(tuple(map(black_to_fade_bool, row)) for row in pixels)
-  is_fade_pixel = lambda x, y : fade[y][x]
-else:
-  is_fade_pixel = lambda x, y : False
-del pixels, metadata
-
-writer = png.Writer(size=(width * IMG_SCALE, height * IMG_SCALE),
-  bitdepth=(len(palette) - 1).bit_length(), palette=palette, compression=9)
+intensity_base = lambda ntsc, lace : (
+  (((0xFF * step_len(lace)) // 0x11) + 1) - anim_len(ntsc, lace))
+intensity_to_index = lambda i, ntsc, lace : (
+  (((i * step_len(lace)) + (0x11 // 2)) // 0x11) - intensity_base(ntsc, lace))
+index_to_intensity = lambda i, ntsc, lace : (
+  (((i + intensity_base(ntsc, lace)) * 0x11) + (step_len(lace) // 2))
+  // step_len(lace))
+black_to_fade_bool = lambda i : i == 0
 
-EAST, STOP, WEST = range(3)
-for n in range(ANIM_LEN):
-  p = [[] for _ in range(3)]
-  for y in range(height):
-    r = [[] for _ in range(3)]
-    for x in range(width):
-      a = cmap[y][x]
-      if a < 0:
-        for i in (EAST, STOP, WEST):
-          r[i] += [BACK] * IMG_SCALE
-        continue
-      a = (a + n + ANIM_BASE + ANIM_LEN) % ANIM_LEN
-      c = RED if a >= ANIM_LEN // 2 else FADE if is_fade_pixel(x, y) else WHITE
-      r[EAST] += IMG_SCALE * [
-        FADE if WHITE == c and a < ROT_FADER else c] 
-      r[STOP] += IMG_SCALE * [c]
-      r[WEST] += IMG_SCALE * [
-        FADE if WHITE == c and a >= ANIM_LEN // 2 - ROT_FADER else c]
+def map_intensity(cmap, ntsc, lace):
+  """intensity_to_index() of a decoded cmap (palette mapping stage)"""
+  with stagetime.stage('palette-map', pixels=cmap.size):
+    return intensity_to_index(cmap, ntsc, lace)
+
+def path_ext(lace=False, backwards=False, img_scale=1, name_base=0):
+  """output directory suffix for non-ROM variants ('' for ROM code)"""
+  ext = ''
+  if backwards : ext += 'b'
+  if lace : ext += 'i'
+  if img_scale != 1: ext += f'x{img_scale}'
+  if name_base != 0: ext += f'n{name_base}'
+  return f'-{ext}' if ext else ''
+
+def read_cmap(cmap_file):
+  """8-bit greyscale colormap as (h, w) intensity array"""
+  with stagetime.stage('png-decode') as t:
+    width, height, pixels, metadata = png.Reader(filename=cmap_file).read()
+    if not metadata['greyscale'] or metadata['bitdepth'] != 8:
+      sys.exit(f'error: {cmap_file!s} has to be a 8-bit grayscale image')
+    t['pixels'] = width * height
+    return np.array(tuple(pixels), dtype=np.intp).reshape(height, width)
+
+def read_mask(mask_file, cmap):
+  """1-bit greyscale shadow mask as (h, w) fade array"""
+  with stagetime.stage('png-decode') as t:
+    width, height, pixels, metadata = png.Reader(filename=mask_file).read()
+    if not metadata['greyscale'] or metadata['bitdepth'] != 1:
+      sys.exit(f'error: {mask_file!s} has to be a 1-bit grayscale image')
+    if (height, width) != cmap.shape:
+      sys.exit(f'error: {mask_file!s} size has to match the cmap')
+    t['pixels'] = width * height
+    return black_to_fade_bool(np.array(tuple(pixels), dtype=np.uint8))
+
+def render_frames(cmap, fade=None, anim_len=anim_len(False),
+    anim_base=anim_base(), rot_fader=ROT_FADER):
+  """all (EAST, STOP, WEST) x anim_len frames as one (3, n, h, w) array"""
+  with stagetime.stage('render', pixels=3 * anim_len * cmap.size):
+    if fade is None: fade = np.zeros(cmap.shape, dtype=bool)
+    n = np.arange(anim_len, dtype=np.intp).reshape(-1, 1, 1)
+    a = (cmap + n + anim_base + anim_len) % anim_len
+    red = a >= anim_len // 2
+    white = ~red & ~fade
+    p = np.empty((3, *a.shape), dtype=np.uint8)
+    p[STOP] = np.where(red, RED, np.where(fade, FADE, WHITE))
+    p[EAST] = np.where(white & (a < rot_fader), FADE, p[STOP])
+    p[WEST] = np.where(white & (a >= anim_len // 2 - rot_fader), FADE, p[STOP])
+    p[:, :, cmap < 0] = BACK
+    return p
+
+scale_rows = lambda p, img_scale : p if img_scale == 1 else (
+  r.repeat(img_scale) for r in p for _ in range(img_scale)) # lazy rows
+
+def encode_frame(p, img_scale=1, optimize=False):
+  """PNG file contents of a frame (process pool worker), optimize replaces
+  the zopflipng --keepcolortype --keepchunks=PLTE release post-processing"""
+  height, width = p.shape
+  writer = png.Writer(size=(width * img_scale, height * img_scale),
+    bitdepth=(len(palette) - 1).bit_length(), palette=palette, compression=9)
+  o = io.BytesIO()
+  writer.write(o, scale_rows(p, img_scale))
+  if not optimize: return o.getvalue()
+  return pngopt.optimize_png(o.getvalue(),
+    p.repeat(img_scale, axis=0).repeat(img_scale, axis=1))
+
+def frame_jobs(frames, frmts, backwards=False, name_base=0, img_scale=1,
+    manifest=None, optimize=False):
+  """(filename, cache inputs, frame, img_scale, optimize) of the (EAST, STOP,
+  WEST) frames to encode (empty frmts entries and unchanged frames are
+  skipped)"""
+  _, anim_len, _, _ = frames.shape
+  todo = []
+  for n in range(anim_len):
     for i in (EAST, STOP, WEST):
-      p[i] += [r[i]] * IMG_SCALE
-  for i in (EAST, STOP, WEST):
-    f = {EAST: EAST_FRMT, STOP: STOP_FRMT, WEST: WEST_FRMT}[i]
-    if not f: continue
-    f = f.format(((ANIM_LEN - n if BACKWARDS else n) % ANIM_LEN) + NAME_BASE)
-    d, _ = os.path.split(f)
-    if d and not os.path.isdir(d): os.makedirs(d)
-    print(f)
-    with open(f, 'wb') as o: writer.write(o, p[i])
-    # release post-processing with zopflipng --keepcolortype
-    # --keepchunks=PLTE --filters=01234meb --iterations=1024
+      f = frmts[i]
+      if not f: continue
+      f = f.format(((anim_len - n if backwards else n) % anim_len) + name_base)
+      inputs = imgcache.hash_data(CODE_HASH, f'x{img_scale}', frames[i, n],
+        *(('zopt', pngopt.CODE_HASH) if optimize else ()))
+      if imgcache.is_current(manifest, f, inputs): continue
+      todo.append((f, inputs, frames[i, n], img_scale, optimize))
+  return todo
+
+def encode_frames(todo, manifest=None, jobs=1, cache_dir=None):
+  """encode and write the frame_jobs() (in a process pool if jobs != 1),
+  optimized frames are kept as blobs (by inputs) and never crunched again"""
+  def store(data):
+    for (f, inputs, _, _, optimize), o, cached in zip(todo, data, blobs):
+      if optimize and cached is None: imgcache.put_blob(cache_dir, inputs, o)
+      if imgcache.write_file(f, o, manifest is None): print(f)
+      imgcache.record(manifest, f, inputs, imgcache.hash_data(o),
+        (inputs,) if optimize and cache_dir else ())
+      t['bytes'] += len(o)
+  blobs = [imgcache.get_blob(cache_dir, inputs) if optimize else None
+    for _, inputs, _, _, optimize in todo]
+  miss = [j for j, o in zip(todo, blobs) if o is None]
+  miss_args = ((p for _, _, p, _, _ in miss), (s for _, _, _, s, _ in miss),
+    (z for _, _, _, _, z in miss))
+  # cached and encoded frames are stored in todo order (ordered file list)
+  merged = lambda encoded : (next(encoded) if o is None else o for o in blobs)
+  with stagetime.stage('png-encode', files=len(miss), bytes=0,
+      pixels=sum(p.size * s * s for _, _, p, s, _ in miss)) as t:
+    if jobs == 1 or len(miss) < 2:
+      store(merged(map(encode_frame, *miss_args)))
+    else: # map() returns the results in submission order
+      with concurrent.futures.ProcessPoolExecutor(jobs or None) as pool:
+        store(merged(pool.map(encode_frame, *miss_args, chunksize=4)))
+
+def write_frames(frames, frmts, backwards=False, name_base=0, img_scale=1,
+    manifest=None, jobs=1):
+  """write the (EAST, STOP, WEST) frames (empty frmts entries are skipped),
+  frames with an unchanged cache manifest entry are not encoded again"""
+  encode_frames(frame_jobs(frames, frmts, backwards, name_base, img_scale,
+    manifest), manifest, jobs)
+
+def parse_args(argv=None):
+  argp = argparse.ArgumentParser(prog='ballanim.py', add_help=False,
+    usage='python3 %(prog)s (--pal | --ntsc) [--interlaced] [--help | options]'
+      '\n       python3 %(prog)s --batch .txt [options]',
+    description='Generate ball animation images from greyscale colormap.',
+    allow_abbrev=False)
+  argp_mode = argp.add_argument_group('mode')
+  argp_ntsc = argp_mode.add_mutually_exclusive_group(required=True)
+  argp_ntsc.add_argument('--pal', '-p', action='store_false', dest='ntsc',
+    help='50Hz (6*2 colors * steps/frame)')
+  argp_ntsc.add_argument('--ntsc', '-n', action='store_true',
+    help='60Hz (7*2 colors * steps/frame)')
+  argp_mode.add_argument('--interlaced', '-i', action='store_true', dest='lace',
+    help='1 step/frame (else progressive)', default=False)
+  argp_mode.add_argument('--batch', metavar='.txt', type=pathlib.Path,
+    help='one variant (mode and options) per line, the run options'
+      ' (--jobs, cache, timings) only on the command line', default=None)
+  argp_mode.add_argument('--help', '-h', action='store_true',
+    help='show this help message and exit', default=False)
+  args, _ = argp.parse_known_args(argv)
+  argp_opts = argp.add_argument_group('options ({0}, {1})'.format(
+    'NTSC' if args.ntsc else 'PAL',
+    'interlaced' if args.lace else 'progressive'))
+  BASE_STR = base_str(args.ntsc)
+  ANIM_LEN = anim_len(args.ntsc, args.lace)
+  ANIM_BASE = anim_base(args.lace)
+  CMAP_FILE = f'{BASE_STR}cmap.png'
+  MASK_FILE = f'{BASE_STR}mask.png' # optional shadow mask
+  argp_opts.add_argument('--cmap-file', metavar='.png', type=pathlib.Path,
+    help=f'8-bit greyscale (={CMAP_FILE})', default=CMAP_FILE)
+  argp_opts.add_argument('--anim-base', metavar=f'{1-ANIM_LEN}..{ANIM_LEN-1}',
+    help=f'first animation pos (default={ANIM_BASE})', default=ANIM_BASE,
+    type=int, choices=range(1-ANIM_LEN, ANIM_LEN))
+  argp_opts.add_argument('--rot-fader', metavar=f'0..{ANIM_LEN // 2}',
+    help=f'rotation fade width (default={ROT_FADER})', default=ROT_FADER,
+    type=int, choices=range(0, (ANIM_LEN // 2) + 1))
+  argp_opts.add_argument('--img-scale', '-x', metavar='1..N',
+    help=f'output image scaler (ROMcode={IMG_SCALE})', default=IMG_SCALE,
+    type=lambda x : int(x) if int(x) >= 1 else argp.error('invalid scale'))
+  argp_opts.add_argument('--name-base', metavar='0..N',
+    help=f'first output number (ROMcode={NAME_BASE})', default=NAME_BASE,
+    type=lambda x : int(x) if int(x) >= 0 else argp.error('invalid offset'))
+  if not MASK_USED:
+    argp_opts.add_argument('--mask-used', action='store_true',
+      help='shadow mask (black: white=fade)', default=False)
+  argp_opts.add_argument('--mask-file',  metavar=f'.png', type=pathlib.Path,
+    help=f'1-bit greyscale (={MASK_FILE})', default=MASK_FILE)
+  if     MAKE_EAST:
+    argp_opts.add_argument('--skip-east', action='store_true',
+      help='do not generate eastward images', default=False)
+  if not MAKE_STOP:
+    argp_opts.add_argument('--make-stop', action='store_true',
+      help='force generating stopped images', default=False)
+  if     MAKE_WEST:
+    argp_opts.add_argument('--skip-west', action='store_true',
+      help='do not generate westward images', default=False)
+  if not BACKWARDS:
+    argp_opts.add_argument('--backwards', action='store_true',
+      help='backward animation order (west)', default=False)
+  argp_opts.add_argument('--jobs', '-j', metavar='0..N',
+    help='parallel PNG encoders (default=1, 0=all CPUs)', default=1,
+    type=lambda x : int(x) if int(x) >= 0 else argp.error('invalid jobs'))
+  argp_opts.add_argument('--optimize', '-O', action='store_true',
+    help='crunch the PNGs (filters, optimal deflate)', default=False)
+  imgcache.add_arguments(argp_opts)
+  stagetime.add_arguments(argp_opts)
+  args = argp.parse_args(argv)
+  if args.help:
+    argp.print_help(sys.stderr)
+    sys.exit(1)
+  args.mask_used = MASK_USED or     args.mask_used
+  args.make_east = MAKE_EAST and not args.skip_east
+  args.make_stop = MAKE_STOP or      args.make_stop or args.mask_used
+  args.make_west = MAKE_WEST and not args.skip_west
+  args.backwards = BACKWARDS or      args.backwards
+  PATH_EXT = path_ext(args.lace, args.backwards, args.img_scale,
+    args.name_base)
+  EAST_PATH = f'{BASE_STR}east{PATH_EXT}'
+  STOP_PATH = f'{BASE_STR}stop{PATH_EXT}'
+  WEST_PATH = f'{BASE_STR}west{PATH_EXT}'
+  EAST_FRMT = os.path.join(EAST_PATH, FILE_FRMT) if args.make_east else ''
+  STOP_FRMT = os.path.join(STOP_PATH, FILE_FRMT) if args.make_stop else ''
+  WEST_FRMT = os.path.join(WEST_PATH, FILE_FRMT) if args.make_west else ''
+  args.frmts = (EAST_FRMT, STOP_FRMT, WEST_FRMT)
+  return args
+
+def variant_jobs(args, manifest=None, shared=None):
+  """frame_jobs() of a variant, the decoded cmaps/masks, index tables and
+  rendered frames are shared with the other variants in the shared dict"""
+  shared = {} if shared is None else shared
+  get = lambda key, make : shared[key] if key in shared else (
+    shared.setdefault(key, make()))
+  cmap = get(('cmap', args.cmap_file), lambda : read_cmap(args.cmap_file))
+  fade = get(('mask', args.mask_file, args.cmap_file),
+    lambda : read_mask(args.mask_file, cmap)) if args.mask_used else None
+  index = get(('index', args.cmap_file, args.ntsc, step_len(args.lace)),
+    lambda : map_intensity(cmap, args.ntsc, args.lace))
+  frames = get(('frames', args.cmap_file, args.mask_used and args.mask_file,
+    args.ntsc, args.lace, args.anim_base, args.rot_fader),
+    lambda : render_frames(index, fade, anim_len(args.ntsc, args.lace),
+      args.anim_base, args.rot_fader))
+  return frame_jobs(frames, args.frmts, args.backwards, args.name_base,
+    args.img_scale, manifest, args.optimize)
+
+def main():
+  batch = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+  batch.add_argument('--batch', type=pathlib.Path, default=None)
+  batch_args, argv = batch.parse_known_args()
+  if batch_args.batch is None:
+    variants = [parse_args(argv)]
+  else: # command line options apply to every variant
+    try:
+      with open(batch_args.batch, 'r', encoding='utf-8') as f:
+        lines = [shlex.split(l, comments=True) for l in f]
+    except OSError as e:
+      sys.exit(f'error: {batch_args.batch!s}: {e.strerror}')
+    except ValueError as e: # shlex (e.g. no closing quotation)
+      sys.exit(f'error: {batch_args.batch!s}: {e}')
+    for n, l in enumerate(lines, 1):
+      for o in l:
+        if o.split('=')[0] in RUN_OPTIONS or o.startswith('-j'):
+          sys.exit(f'error: {batch_args.batch!s}:{n:d}: {o} applies to the'
+            ' whole run (command line only)')
+    variants = [parse_args([*l, *argv]) for l in lines if l]
+  if not variants: sys.exit(f'error: {batch_args.batch!s} has no variants')
+  frmts = [f for v in variants for f in v.frmts if f]
+  for f in sorted({f for f in frmts if frmts.count(f) > 1}):
+    sys.exit(f'error: {os.path.dirname(f)} is written by several variants')
+  args = variants[0]
+  stagetime.enable('ballanim', args.timings, args.profile)
+  manifest = imgcache.load(None if args.no_cache else args.cache_dir)
+  shared = {}
+  todo = [j for v in variants for j in variant_jobs(v, manifest, shared)]
+  encode_frames(todo, manifest, args.jobs, # one pool for all variants
+    None if args.no_cache else args.cache_dir)
+  imgcache.save(args.cache_dir, manifest)
+  stagetime.save()
 
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+
+# not-so-random quote: "i'll be back... in 0.25 seconds"
+
+import argparse
+import imgcache
+import json
+import numpy as np
+import os
+import pathlib
+import png
+import re
+import shutil
+import sprcheck
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC_DIR = pathlib.Path(__file__).resolve().parent
+GOLDEN_DIR = SRC_DIR # committed ROM data and frames
+INPUT_FILES = ('ballcmap.png', 'ntsccmap.png', 'pointer.png')
+FRAME_DIRS = ('ballwest', 'balleast', 'ntscwest', 'ntsceast')
+
+# (stage name, script, arguments, golden files (compared byte by byte, a .bin
+# with the longs of the .i))
+stages = lambda : [
+  ('ballpath-pal', 'gimp/ballpath.py', ('--output', 'ballpath.svg'),
+    {'ballpath.svg': 'gimp/ballpath.svg'}),
+  ('ballpath-ntsc', 'gimp/ballpath.py', ('--ntsc', '--output', 'ntscpath.svg'),
+    {'ntscpath.svg': 'gimp/ntscpath.svg'}),
+  *[(f'ballanim-{"ntsc" if ntsc else "pal"}{"-i" if lace else ""}'
+    f'{"-b" if backwards else ""}', 'ballanim.py',
+    ('--ntsc' if ntsc else '--pal', *(('--interlaced',) if lace else ()),
+      *(('--backwards',) if backwards else ())), {})
+    for ntsc in (False, True) for lace in (False, True)
+    for backwards in (False, True)],
+  # reads the frames of the ballanim-(pal|ntsc) stages (original workflow)
+  ('sprdata-pal', 'sprdata.py', ('--pal',), {'balldata.i': 'balldata.i'}),
+  ('sprdata-ntsc', 'sprdata.py', ('--ntsc',), {'ntscdata.i': 'ntscdata.i'}),
+  # renders the frames from the cmap in memory (the Makefile way)
+  ('sprdata-pal-cmap', 'sprdata.py', ('--pal', '--cmap', '--no-cache'),
+    {'balldata.i': 'balldata.i'}),
+  ('sprdata-ntsc-cmap', 'sprdata.py', ('--ntsc', '--cmap', '--no-cache'),
+    {'ntscdata.i': 'ntscdata.i'}),
+  ('sprdata-pal-bin', 'sprdata.py', ('--pal', '--cmap', '--binary'),
+    {'balldata.bin': 'balldata.i'}),
+  ('sprdata-ntsc-bin', 'sprdata.py', ('--ntsc', '--cmap', '--binary'),
+    {'ntscdata.bin': 'ntscdata.i'}),
+  ('ptrdata', 'ptrdata.py', (), {'ptrdata.i': 'ptrdata.i'}),
+  # large frames: 258-byte matches and distances beyond the deflate window
+  ('ballanim-pal-x4', 'ballanim.py', ('--pal', '-x', '4', '--skip-east'), {}),
+  ('pngopt-x4', 'pngopt.py', ('ballwest-x4/image000.png',), {})]
+
+def snapshot(work_dir):
+  """{relative path: (size, mtime)} of the files in the work directory
+  (without the build cache)"""
+  return {p.relative_to(work_dir).as_posix(): (s.st_size, s.st_mtime_ns)
+    for p in work_dir.rglob('*') if p.is_file()
+    and imgcache.CACHE_DIR not in p.relative_to(work_dir).parts
+    for s in (p.stat(),)}
+
+def run_stage(python, script, args, work_dir):
+  """(wall time, peak RSS in KiB) of a generator run in the work directory"""
+  t = time.perf_counter()
+  p = subprocess.Popen((python, str(script), *args), cwd=work_dir,
+    stdout=subprocess.DEVNULL)
+  _, status, rusage = os.wait4(p.pid, 0)
+  t = time.perf_counter() - t
+  p.returncode = os.waitstatus_to_exitcode(status)
+  if p.returncode:
+    sys.exit(f'error: {script} {" ".join(args)} failed ({p.returncode})')
+  return t, rusage.ru_maxrss
+
+def unsupported(python, src_dir, probe_dir):
+  """{stage name: reason} of the stages the source tree cannot run (older
+  checkouts miss scripts or silently ignore unknown options), the options
+  are looked up in the --help output (run in the probe directory, old
+  scripts without --help just generate their output there)"""
+  helps, skip = {}, {}
+  for name, script, args, _ in stages():
+    if not (src_dir / script).is_file():
+      skip[name] = f'{script} missing'
+      continue
+    mode = tuple(a for a in args if a in ('--pal', '--ntsc'))
+    if (script, mode) not in helps:
+      p = subprocess.run((python, str(src_dir / script), *mode, '--help'),
+        cwd=probe_dir, capture_output=True, text=True)
+      helps[script, mode] = p.stdout + p.stderr
+    missing = [o for o in (a.split('=')[0] for a in args if a[:1] == '-')
+      if not re.search(rf'(?<![\w-]){re.escape(o)}(?![\w-])',
+        helps[script, mode])]
+    if missing: skip[name] = f'{script} has no {" ".join(missing)}'
+  return skip
+
+def read_rgba(filename):
+  """(h, w) palette colors of a PNG (files optimized with another palette
+  order or filters still compare equal)"""
+  width, height, pixels, metadata = png.Reader(filename=filename).read()
+  palette = [(*c, 255)[:4] for c in metadata['palette']]
+  index = np.array(tuple(pixels), dtype=np.intp).reshape(height, width)
+  return np.array(palette, dtype=np.uint8)[index]
+
+def check_frames(work_dir, golden_dir):
+  """compare the pixels of the ROM frames with the committed frames"""
+  errors = []
+  for d in FRAME_DIRS:
+    for g in sorted((golden_dir / d).glob('image*.png')):
+      f = work_dir / d / g.name
+      if not f.is_file():
+        errors.append(f'{d}/{g.name} missing')
+      elif not np.array_equal(read_rgba(f), read_rgba(g)):
+        errors.append(f'{d}/{g.name} differs')
+  return errors
+
+def same_data(output, golden):
+  """byte by byte (a .bin output with the longs of a .i golden file)"""
+  if output.suffix == '.bin' and golden.suffix == '.i':
+    return np.array_equal(sprcheck.read_bin(output), sprcheck.read_asm(golden))
+  return output.read_bytes() == golden.read_bytes()
+
+def check_files(work_dir, golden_dir, golden):
+  errors = []
+  for f, g in golden.items():
+    if not (work_dir / f).is_file():
+      errors.append(f'{f} missing')
+    elif not same_data(work_dir / f, golden_dir / g):
+      errors.append(f'{f} differs from {g}')
+  return errors
+
+def benchmark(python, src_dir, golden_dir, repeat=1, keep=False):
+  """run all stages (best of repeat runs), returns the results, errors and
+  the skipped stages (see unsupported())"""
+  results, errors = {}, []
+  probe_dir = pathlib.Path(tempfile.mkdtemp(prefix='cpubltro-bench-'))
+  try:
+    for f in INPUT_FILES: shutil.copy(src_dir / f, probe_dir)
+    skipped = unsupported(python, src_dir, probe_dir)
+  finally:
+    shutil.rmtree(probe_dir)
+  for r in range(repeat):
+    work_dir = pathlib.Path(tempfile.mkdtemp(prefix='cpubltro-bench-'))
+    try:
+      for f in INPUT_FILES: shutil.copy(src_dir / f, work_dir)
+      for name, script, args, golden in stages():
+        if name in skipped: continue
+        before = snapshot(work_dir)
+        t, rss = run_stage(python, src_dir / script, args, work_dir)
+        after = snapshot(work_dir)
+        written = [f for f, s in after.items() if before.get(f) != s]
+        size = sum(after[f][0] for f in written)
+        if r == 0:
+          errors += [f'{name}: {e}' for e in
+            check_files(work_dir, golden_dir, golden)]
+        if name in results:
+          t = min(t, results[name]['time'])
+          rss = max(rss, results[name]['rss'])
+        results[name] = {'time': t, 'rss': rss, 'files': len(written),
+          'bytes': size}
+      if r == 0:
+        errors += [f'ballanim: {e}' for e in
+          check_frames(work_dir, golden_dir)]
+    finally:
+      if keep: print(f'work directory: {work_dir}', file=sys.stderr)
+      else: shutil.rmtree(work_dir)
+  return results, errors, skipped
+
+def report(results, baseline=None, file=sys.stdout):
+  print(f'{"stage":<18} {"time/s":>8} {"RSS/MiB":>8} {"files":>5}'
+    f' {"bytes":>8}{"  before/s  speed-up" if baseline else ""}', file=file)
+  total = lambda names : {
+    'time': sum(results[n]['time'] for n in names),
+    'rss': max(results[n]['rss'] for n in names),
+    'files': sum(results[n]['files'] for n in names),
+    'bytes': sum(results[n]['bytes'] for n in names)}
+  rows = [*results.items(), ('total', total(results))]
+  if baseline: # only the stages that both runs have are compared
+    shared = [n for n in results if n in baseline]
+    if shared: rows.append(('shared', total(shared)))
+    baseline = {**baseline,
+      'shared': {'time': sum(baseline[n]['time'] for n in shared)}}
+  for name, r in rows:
+    line = (f'{name:<18} {r["time"]:8.3f} {r["rss"] / 1024:8.1f}'
+      f' {r["files"]:5d} {r["bytes"]:8d}')
+    if baseline and name in baseline:
+      b = baseline[name]['time']
+      line += f'  {b:8.3f} {b / r["time"]:8.2f}x'
+    print(line, file=file)
+
+def main():
+  argp = argparse.ArgumentParser(prog='benchmark.py', add_help=True,
+    usage='python3 %(prog)s [--help | options]',
+    description='Benchmark the image generators and compare their outputs'
+      ' with the committed ROM data.',
+    allow_abbrev=False)
+  argp.add_argument('--python', metavar='EXE',
+    help='interpreter for the generators (default=this one)',
+    default=sys.executable)
+  argp.add_argument('--src-dir', metavar='DIR', type=pathlib.Path,
+    help='images/ directory of the generators (e.g. an older checkout)',
+    default=SRC_DIR)
+  argp.add_argument('--repeat', '-r', metavar='1..N',
+    help='runs per stage, reports the best time (default=1)', default=1,
+    type=lambda x : int(x) if int(x) >= 1 else argp.error('invalid repeat'))
+  argp.add_argument('--save', metavar='.json', type=pathlib.Path,
+    help='write the results (e.g. before a change)')
+  argp.add_argument('--baseline', metavar='.json', type=pathlib.Path,
+    help='show the speed-up against saved results')
+  argp.add_argument('--keep', action='store_true',
+    help='keep the work directories', default=False)
+  args = argp.parse_args()
+
+  baseline = None
+  if args.baseline:
+    with open(args.baseline, 'r', encoding='ascii') as f:
+      baseline = json.load(f)
+  results, errors, skipped = benchmark(args.python, args.src_dir.resolve(),
+    GOLDEN_DIR, args.repeat, args.keep)
+  report(results, baseline)
+  for name, reason in skipped.items():
+    print(f'skipped: {name} ({reason})', file=sys.stderr)
+  if args.save:
+    with open(args.save, 'w', encoding='ascii') as f:
+      json.dump(results, f, indent=1)
+  for e in errors: print(f'mismatch: {e}', file=sys.stderr)
+  if errors: sys.exit(f'error: {len(errors)} output(s) differ')
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+# not-so-random quote: "we are not in a hurry, we are just in time"
+
+import argparse
+import re
+import sprdata
+import sys
+
+ASM_FILENAME = '../cpubltro.asm'
+LINE_SLOTS = 227 # $00-$E2, NTSC long lines have an extra slot $E3 (LOL)
+LINE_START = 0xDE # DrwLine sync position (see DrwSync)
+REFRESH_SLOTS = (0x00, 0x02, 0x04, 0x06) # memory refresh (M), always used
+CHIP_ACCESS = 'Ww' # custom chip writes (ROM reads and prefetches never wait)
+# bus patterns of the uncommented instructions (one character per slot)
+KNOWN_PATTERNS = {'nop': '.p', 'abcd': '..p'}
+# replacement of a sprite data move if the long is zero (line-skip layout)
+ZERO_PATTERNS = {'move.l': '.p.W.w.p', 'move.w': '.p'} # D0 instead of (a2)+
+
+line_slots = lambda long_line : LINE_SLOTS + (1 if long_line else 0)
+
+def read_drwline(asm_filename):
+  """(instruction, bus pattern, annotated first/last slot) of the DrwLine
+  loop, the patterns are taken from the slot comments of cpubltro.asm"""
+  code, active = [], False
+  with open(asm_filename, 'r', encoding='latin-1') as f:
+    for line in f:
+      src, _, comment = line.partition(';')
+      if src.startswith('DrwLine:'):
+        active, src = True, src[len('DrwLine:'):]
+      if not active or not src.strip(): continue
+      insn = ' '.join(src.split())
+      m = re.match(r'\s*\$([0-9A-F]{2})-\$([0-9A-F]{2})\s+([-.\[\]RrWwp]+)',
+        comment)
+      if m:
+        pattern = re.sub(r'\[-\]|-', '', m.group(3)) # waits are simulated
+        first, last = int(m.group(1), 16), int(m.group(2), 16)
+      elif insn.split()[0] in KNOWN_PATTERNS:
+        pattern, first, last = KNOWN_PATTERNS[insn.split()[0]], None, None
+      else:
+        sys.exit(f'error: {asm_filename}: no slot comment for "{insn}"')
+      code.append((insn, pattern, first, last))
+      if insn.startswith('dbf'): return code
+  sys.exit(f'error: {asm_filename}: DrwLine loop not found')
+
+def sprite_moves(code):
+  """indices of the (a2)+ sprite data moves per sprite column (1..7)"""
+  moves = [i for i, (insn, _, _, _) in enumerate(code)
+    if re.match(r'move\.[lw] \(a2\)\+,', insn)]
+  # spr1..spr6 with move.l, spr7 with two move.w (SPR7DATA/SPR7DATB)
+  return [[i] for i in moves[:6]] + [moves[6:]]
+
+def line_schedule(code, zero_columns=()):
+  """bus patterns of one DrwLine pass, the sprite columns without data
+  are written with D0 (no (a2)+ read)"""
+  patterns = [pattern for _, pattern, _, _ in code]
+  moves = sprite_moves(code)
+  for c in zero_columns:
+    for i in moves[c]:
+      patterns[i] = ZERO_PATTERNS[code[i][0].split()[0]]
+  return patterns
+
+def beam(ntsc, lines, long_first=True, dma_slots=REFRESH_SLOTS):
+  """slot timeline (hpos, line, busy) of consecutive lines (NTSC lines
+  alternate between long and short)"""
+  hpos, line, busy = [], [], []
+  for n in range(lines):
+    long_line = ntsc and (((n & 1) == 0) == long_first)
+    for h in range(line_slots(long_line)):
+      hpos.append(h)
+      line.append(n)
+      busy.append(h in dma_slots)
+  return hpos, line, busy
+
+def run(timeline, start, schedules):
+  """simulate the passes (one per line), returns per pass the (first,
+  last) absolute slot of every instruction and the end slot"""
+  _, _, busy = timeline
+  t, result = start, []
+  for patterns in schedules:
+    spans = []
+    for pattern in patterns:
+      first = t
+      for c in pattern:
+        if c in CHIP_ACCESS:
+          while busy[t]: t += 1 # CPU has lower priority than the DMA
+        t += 1
+      spans.append((first, t - 1))
+    result.append((spans, t))
+  return result
+
+def check_annotations(code, timeline, passes):
+  """compare the simulated slots of the first pass with the comments"""
+  hpos, _, _ = timeline
+  errors = []
+  spans, _ = passes[0]
+  for (insn, _, first, last), (s, e) in zip(code, spans):
+    if first is None: continue
+    if (hpos[s], hpos[e]) != (first, last):
+      errors.append(f'{insn}: ${hpos[s]:02X}-${hpos[e]:02X}'
+        f' (comment ${first:02X}-${last:02X})')
+  return errors
+
+def check_phase(timeline, passes):
+  """the loop has to start every line (after the sync pass) at the same
+  slot, returns the lines with a different start slot"""
+  hpos, _, _ = timeline
+  phase = hpos[passes[1][0][0][0]]
+  return [n for n, (spans, _) in enumerate(passes[1:], 1)
+    if hpos[spans[0][0]] != phase]
+
+def report(timeline, passes, reference, file=sys.stdout):
+  """start slot and slack (slots ahead of the full layout) per pass,
+  returns the number of lines that are out of sync with the beam"""
+  hpos, _, _ = timeline
+  drift, lines = 0, 0
+  print(' line start  used slack drift', file=file)
+  for n, ((spans, end), (_, ref_end)) in enumerate(zip(passes, reference)):
+    start = spans[0][0]
+    slack = (ref_end - end) - drift
+    drift = ref_end - end
+    if drift: lines += 1
+    print(f'{n:5d}   ${hpos[start]:02X} {end - start:5d} {slack:+5d}'
+      f' {drift:+5d}', file=file)
+  return lines
+
+def main():
+  argp = argparse.ArgumentParser(prog='dmaslots.py', add_help=True,
+    usage='python3 %(prog)s (--pal | --ntsc | --help) [options]',
+    description='Simulate the DMA time slots of the DrwLine loop.',
+    allow_abbrev=False)
+  argp_mode = argp.add_argument_group('mode')
+  argp_ntsc = argp_mode.add_mutually_exclusive_group(required=True)
+  argp_ntsc.add_argument('--pal', action='store_false', dest='ntsc',
+    help=f'{LINE_SLOTS} slots/line')
+  argp_ntsc.add_argument('--ntsc', action='store_true',
+    help=f'{LINE_SLOTS}/{LINE_SLOTS + 1} slots/line (LOL)')
+  argp_mode.add_argument('--layout', choices=('full', 'line-skip'),
+    help='sprite data layout (default=full)', default='full')
+  argp_mode.add_argument('--cmap', action='store_true',
+    help='line-skip layout from the cmap (else PNGs)', default=False)
+  argp_mode.add_argument('--asm-file', metavar='.asm',
+    help=f'drawing routine (default={ASM_FILENAME})', default=ASM_FILENAME)
+  args = argp.parse_args()
+
+  code = read_drwline(args.asm_file)
+  if args.layout == 'full':
+    zero = [()] * sprdata.img_height(args.ntsc)
+  else:
+    frames = (sprdata.cmap_frames if args.cmap else sprdata.read_frames)(
+      args.ntsc)
+    lead, count = sprdata.line_skip(
+      [sprdata.pack_sprites(load()) for _, _, load in frames])
+    zero = [tuple(c for c in range(sprdata.SPR_COUNT) if c < l or c >= l + n)
+      for l, n in zip(lead.tolist(), count.tolist())]
+  mode = 'NTSC' if args.ntsc else 'PAL'
+  full = [line_schedule(code)] * len(zero)
+  errors, drifts = [], 0
+  for long_first in ((True, False) if args.ntsc else (False,)):
+    timeline = beam(args.ntsc, len(zero) + 2, long_first)
+    reference = run(timeline, LINE_START, full)
+    if not long_first: # comments are based on a short first line
+      errors += check_annotations(code, timeline, reference)
+    for n in check_phase(timeline, reference):
+      sys.exit(f'error: {mode} DrwLine is out of sync in line {n}')
+    passes = run(timeline, LINE_START,
+      [line_schedule(code, z) for z in zero])
+    print(f'{mode} DrwLine ({args.layout} layout'
+      f'{", long line first" if args.ntsc and long_first else ""}):')
+    drifts += report(timeline, passes, reference)
+  for e in errors: print(f'warning: {e}', file=sys.stderr)
+  if drifts:
+    sys.exit(f'error: {mode} DrwLine with the {args.layout} layout is'
+      f' out of sync in {drifts} line(s), the skipped moves need padding')
+
+if __name__ == '__main__':
+  main()
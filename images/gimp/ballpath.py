@@ -3,8 +3,15 @@
 # not-so-random quote: "this little maneuver's gonna cost us fifty-one years"
 
 import argparse
+import decimal
+import functools
+import numpy as np
 import pathlib
+import png
+import sys
 from mpmath import mp
+sys.path.insert(1, str(pathlib.Path(__file__).resolve().parent.parent))
+import stagetime # images/stagetime.py
 
 mp.dps = 17 * 2 # work with quadruple precision, print with double precision
 ff = lambda x : mp.nstr(x, mp.dps // 2, min_fixed=mp.ninf, max_fixed=mp.inf)
@@ -42,152 +49,416 @@ SAR_X, SAR_Y, DAR_X, DAR_Y = (320, 256, 5, 4)
 P_COLOR = ( # (PAL / 6) / (NTSC / 7) = 97.22% of original NTSC rotation speed
   0x005, 0x00F, 0x050, 0x05A, 0x0A5, 0x0AF,
   0x0FA, 0x505, 0x50F, 0x5A0, 0x5AA, 0x5F5)
-if __name__ == '__main__':
-  parser = argparse.ArgumentParser()
-  parser.add_argument('--output',  metavar=f'.svg', type=pathlib.Path,
-    default=argparse.SUPPRESS, help=f'output filename (default={PATH_FILE})')
-  parser.add_argument('--ntsc', action='store_true',
-    default=False, help=f'generate a NTSC variant ({NTSC_FILE})')
-  args = parser.parse_args()
-  if hasattr(args, 'output'): PATH_FILE = args.output
-  if args.ntsc:
-    if not hasattr(args, 'output'): PATH_FILE = NTSC_FILE
-    SAR_X, SAR_Y, DAR_X, DAR_Y = (320, 200, 4, 3)
-    P_COLOR = (*P_COLOR[0:6], 0x0F0, *P_COLOR[6:12], 0x5FF)
-B_HEIGHT = (B_WIDTH * SAR_Y * DAR_X + SAR_X * DAR_Y // 2) // (SAR_X * DAR_Y)
-ANIM_LEN = len(P_COLOR) * 2 # * 2 fields/frame
+NTSC_SAR_DAR = (320, 200, 4, 3)
+NTSC_COLOR = (*P_COLOR[0:6], 0x0F0, *P_COLOR[6:12], 0x5FF)
+b_height = lambda b_width, sar_x, sar_y, dar_x, dar_y : (
+  (b_width * sar_y * dar_x + sar_x * dar_y // 2) // (sar_x * dar_y))
 Q_COUNT = 8 // 2
 Q_ANGLE = mp.pi / 2 / Q_COUNT
-A_COUNT = ANIM_LEN // 2 * Q_COUNT
 R_ANGLE = mp.atan(mp.mpf(1) / 3) # 1:3 pixel stairs (clockwise, before scale)
 BEZIERK = (mp.sqrt(385) - 13) / 12 # ~0.55178474 (integral of the errors = 0)
-X_SCALE = mp.mpf(B_WIDTH) / 2
-Y_SCALE = mp.mpf(B_HEIGHT) / 2
 EAST, NORTH, WEST, SOUTH = (mp.mpf(0), mp.pi / 2, mp.pi, mp.pi * 3 / 2)
-globe_p = lambda a, r=(X_SCALE, Y_SCALE), o=(X_SCALE, Y_SCALE) : (
+globe_p = lambda a, r, o : (
   o[0] + r[0] * mp.cos(a - R_ANGLE), o[1] - r[1] * mp.sin(a - R_ANGLE))
-NORTH_P = globe_p(NORTH)
-SOUTH_P = globe_p(SOUTH)
-
-xml = (
-  '<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n' +
-  '<!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 1.0//EN"\n' +
-  '\t"http://www.w3.org/TR/2001/REC-SVG-20010904/DTD/svg10.dtd">\n' +
-  '<svg version="1.0" xmlns="http://www.w3.org/2000/svg"\n' +
-  '\txmlns:xlink="http://www.w3.org/1999/xlink"\n' +
-  f'\tviewBox="0 0 {B_WIDTH} {B_HEIGHT}"' +
-  f' width="{B_WIDTH}px" height="{B_HEIGHT}px"' +
-  ' preserveAspectRatio="xMinYMin">\n' +
-  '\t<!-- disable path anti-aliasing in GIMP -->\n' +
-  '\t<style type="text/css">path, rect {' +
-  ' shape-rendering: crispEdges; }</style>\n' +
-  '\t<defs>\n' +
-  '\t\t<!-- binary channel filter (round to on/off) -->\n' +
-  f'\t\t<filter id="f" x="0" y="0" width="{B_WIDTH}" height="{B_HEIGHT}">\n' +
-  '\t\t\t<feComponentTransfer>\n' +
-  '\t\t\t\t<feFuncR type="discrete" tableValues="0 1"/>\n' +
-  '\t\t\t\t<feFuncG type="discrete" tableValues="0 1"/>\n' +
-  '\t\t\t\t<feFuncB type="discrete" tableValues="0 1"/>\n' +
-  '\t\t\t\t<feFuncA type="discrete" tableValues="0 1"/>\n' +
-  '\t\t\t</feComponentTransfer>\n' +
-  '\t\t</filter>\n' +
-  f'\t\t<rect id="a" x="0" y="0" width="{B_WIDTH}" height="{B_HEIGHT}"/>\n')
-xml += (
-  '\t\t<!-- transformed arcs (GIMP does not tranform paths on import) -->\n')
-# SVG arcs would be sufficient for PAR 1:1, but for height scaling we have
-# to use cubic Bézier curves (GIMP converts the arcs during import anyway)
-for i in reversed(range(A_COUNT)):
-  COVERT = mp.cos(i * mp.pi / 2 / A_COUNT)
-  WEST_P = globe_p(WEST, (X_SCALE * COVERT, Y_SCALE * COVERT))
-  EAST_P = globe_p(EAST, (X_SCALE * COVERT, Y_SCALE * COVERT))
-  ctrl_p = lambda o, a, k : globe_p(a, (X_SCALE * k, Y_SCALE * k), o)
-  xml += (
-    '\t\t<path id="a{0:02d}" d="M {1},{2}\n' +
-    '\t\t\tC {3},{4}\n' +
-    '\t\t\t  {5},{6} {7},{8}\n' +
-    '\t\t\tS {9},{10} {11},{12}\n' +
-    '\t\t\tS {13},{14} {15},{16}\n' +
-    '\t\t\tS {17},{18} {19},{20}\n' +
-    '\t\t\tZ"/><clipPath id="c{0:02d}">' +
-    '<use xlink:href="#a{0:02d}"/></clipPath>\n').format(A_COUNT - i,
-    *map(ff, NORTH_P), *map(ff, ctrl_p(NORTH_P, WEST, BEZIERK * COVERT)),
-    *map(ff, ctrl_p(WEST_P, NORTH, BEZIERK)), *map(ff, WEST_P),
-    *map(ff, ctrl_p(SOUTH_P, WEST, BEZIERK * COVERT)), *map(ff, SOUTH_P),
-    *map(ff, ctrl_p(EAST_P, SOUTH, BEZIERK)), *map(ff, EAST_P),
-    *map(ff, ctrl_p(NORTH_P, EAST, BEZIERK * COVERT)), *map(ff, NORTH_P))
-xml += (
-  '\t\t<mask id="m">\n' +
-  '\t\t\t<path id="l" d="M {0},{1}\n' +
-  '\t\t\t\tV 0 H 0 V {2} H {3} V {4} Z" fill="white"/>\n' +
-  '\t\t</mask>\n' +
-  '\t</defs>\n').format(*map(ff, NORTH_P), B_HEIGHT, *map(ff, SOUTH_P))
-xml += (
-  '\t<!-- arc fill is only for illustration, can be ignored/deleted -->\n' +
-  '\t<g id="v" filter="url(#f)" mask="url(#m)">\n')
-for i in range(A_COUNT):
-  xml += (
-    '\t\t<use xlink:href="#a" clip-path="url(#c{0:02d})" fill="{1}"/>\n'
-    ).format(A_COUNT - i, 'black' if i & 1 else 'white')
-xml += (
-  '\t</g>\n' +
-  '\t<g id="h">\n')
-for i in reversed(range(1, Q_COUNT)):
-  xml += (
-    '\t\t<path id="n{0}" d="M {1},{2} L {3},{4} Z"/>\n').format(i,
-    *map(ff, globe_p(WEST - Q_ANGLE * i)),
-    *map(ff, globe_p(EAST + Q_ANGLE * i)))
-xml += (
-  '\t\t<path id="h0" d="M {0},{1} L {2},{3} Z"/>\n').format(
-    *map(ff, globe_p(WEST)), *map(ff, globe_p(EAST)))
-for i in range(1, Q_COUNT):
-  xml += (
-    '\t\t<path id="s{0}" d="M {1},{2} L {3},{4} Z"/>\n').format(i,
-    *map(ff, globe_p(WEST + Q_ANGLE * i)),
-    *map(ff, globe_p(EAST - Q_ANGLE * i)))
-xml += (
-  '\t</g>\n')
-if len(P_COLOR) == ANIM_LEN // 2:
-  P_SIZE = (3 * (6 * 2)) // len(P_COLOR)
-  xml += (
-    '\t<!-- animation grayscale ({0} * 2) * 2 intensity levels -->\n' +
-    '\t<g id="g">\n').format(len(P_COLOR) // 2)
-  for i in reversed(range(0, len(P_COLOR) * 2)):
-    xml += (
-      '\t\t<rect id="g{0:02d}" fill="#{3:02x}{3:02x}{3:02x}"' +
-      ' width="{0}" height="{0}"'.format(P_SIZE) +
-      ' y="{2}" x="{1}"/>\n').format(len(P_COLOR) * 2 - i,
-      B_WIDTH - P_SIZE - (
-        P_SIZE * ((len(P_COLOR) * 2 - i - 1) % (len(P_COLOR) // 2))),
-      P_SIZE * ((len(P_COLOR) * 2 - i - 1) // (len(P_COLOR) // 2)),
-      ((0xFF * 2 // 0x11 - i) * 0x11 + 2 // 2) // 2)
-  xml += (
+# lines of latitude (north, equator, south) as (west, east) angles
+latitudes = lambda : (
+  *((WEST - Q_ANGLE * i, EAST + Q_ANGLE * i)
+    for i in reversed(range(1, Q_COUNT))), (WEST, EAST),
+  *((WEST + Q_ANGLE * i, EAST - Q_ANGLE * i) for i in range(1, Q_COUNT)))
+CHECK_EVERY = 24 # mpmath reference for every n-th arc of the fast path
+
+def arc_values(i, a_count, scale):
+  """transformed arc i as cubic Bézier curve (20 values in path order)"""
+  X_SCALE, Y_SCALE = scale
+  p = lambda a, r=scale, o=scale : globe_p(a, r, o)
+  NORTH_P = p(NORTH)
+  SOUTH_P = p(SOUTH)
+  COVERT = mp.cos(i * mp.pi / 2 / a_count)
+  WEST_P = p(WEST, (X_SCALE * COVERT, Y_SCALE * COVERT))
+  EAST_P = p(EAST, (X_SCALE * COVERT, Y_SCALE * COVERT))
+  ctrl_p = lambda o, a, k : p(a, (X_SCALE * k, Y_SCALE * k), o)
+  return (
+    *NORTH_P, *ctrl_p(NORTH_P, WEST, BEZIERK * COVERT),
+    *ctrl_p(WEST_P, NORTH, BEZIERK), *WEST_P,
+    *ctrl_p(SOUTH_P, WEST, BEZIERK * COVERT), *SOUTH_P,
+    *ctrl_p(EAST_P, SOUTH, BEZIERK), *EAST_P,
+    *ctrl_p(NORTH_P, EAST, BEZIERK * COVERT), *NORTH_P)
+mask_values = lambda scale : (
+  *globe_p(NORTH, scale, scale), *globe_p(SOUTH, scale, scale))
+line_values = lambda w, e, scale : (
+  *globe_p(w, scale, scale), *globe_p(e, scale, scale))
+
+def exact_values(a_count, scale):
+  """printed (arcs, mask, lines) values, computed with mpmath"""
+  return (
+    [tuple(map(ff, arc_values(i, a_count, scale)))
+      for i in reversed(range(a_count))],
+    tuple(map(ff, mask_values(scale))),
+    [tuple(map(ff, line_values(w, e, scale))) for w, e in latitudes()])
+
+# double-double arithmetic on float64 arrays (value = hi + lo, ~32 digits),
+# a float64 alone has less than the 17 printed significant digits
+def dd_two_sum(a, b):
+  s = a + b
+  v = s - a
+  return s, (a - (s - v)) + (b - v)
+
+def dd_two_prod(a, b):
+  split = lambda x : (lambda c : (c - (c - x), x - (c - (c - x))))(
+    134217729.0 * x) # 2**27 + 1
+  p = a * b
+  (ah, al), (bh, bl) = split(a), split(b)
+  return p, ((ah * bh - p) + ah * bl + al * bh) + al * bl
+
+def dd_norm(h, l):
+  s = h + l
+  return s, l - (s - h)
+
+def dd_add(a, b):
+  s, e = dd_two_sum(a[0], b[0])
+  t, f = dd_two_sum(a[1], b[1])
+  s, e = dd_norm(s, e + t)
+  return dd_norm(s, e + f)
+
+def dd_mul(a, b):
+  p, e = dd_two_prod(a[0], b[0])
+  return dd_norm(p, e + (a[0] * b[1] + a[1] * b[0]))
+
+dd_neg = lambda a : (-a[0], -a[1])
+dd_from_mp = lambda values : (
+  np.array([float(v) for v in values]),
+  np.array([float(v - float(v)) for v in values]))
+
+@functools.cache
+def dd_tables(a_count):
+  """cos/sin of k * Q_ANGLE - R_ANGLE (k = -Q_COUNT..3*Q_COUNT), cos of the
+  arc angles and BEZIERK (shared by all ball sizes and aspect ratios)"""
+  k = range(-Q_COUNT, 3 * Q_COUNT + 1)
+  return (
+    dd_from_mp([mp.cos(i * Q_ANGLE - R_ANGLE) for i in k]),
+    dd_from_mp([mp.sin(i * Q_ANGLE - R_ANGLE) for i in k]),
+    dd_from_mp([mp.cos(i * mp.pi / 2 / a_count)
+      for i in reversed(range(a_count))]),
+    dd_from_mp([BEZIERK]))
+
+def fast_values(a_count, scale):
+  """(arcs, mask, lines) as double-double (hi, lo) arrays of the shapes
+  (a_count, 20), (4,) and (2 * Q_COUNT - 1, 4), and the absolute error"""
+  COS, SIN, COVERT, K = dd_tables(a_count)
+  scale = tuple(float(s) for s in scale) # B_WIDTH / 2 and B_HEIGHT / 2
+  X, Y = ((np.float64(s), np.float64(0)) for s in scale)
+  at = lambda t, k : (t[0][k + Q_COUNT], t[1][k + Q_COUNT])
+  p = lambda k, r=(X, Y), o=(X, Y) : (dd_add(o[0], dd_mul(r[0], at(COS, k))),
+    dd_add(o[1], dd_neg(dd_mul(r[1], at(SIN, k)))))
+  E, N, W, S = (i * Q_COUNT for i in range(4))
+  NORTH_P = p(N)
+  SOUTH_P = p(S)
+  WEST_P = p(W, (dd_mul(X, COVERT), dd_mul(Y, COVERT)))
+  EAST_P = p(E, (dd_mul(X, COVERT), dd_mul(Y, COVERT)))
+  KC = dd_mul(K, COVERT)
+  ctrl_p = lambda o, k, b : p(k, (dd_mul(X, b), dd_mul(Y, b)), o)
+  stack = lambda values, shape : tuple(np.stack(
+    [np.broadcast_to(v[j], shape) for v in values], axis=-1) for j in (0, 1))
+  arcs = stack((
+    *NORTH_P, *ctrl_p(NORTH_P, W, KC), *ctrl_p(WEST_P, N, K), *WEST_P,
+    *ctrl_p(SOUTH_P, W, KC), *SOUTH_P, *ctrl_p(EAST_P, S, K), *EAST_P,
+    *ctrl_p(NORTH_P, E, KC), *NORTH_P), (a_count,))
+  lines = [stack((*p(w), *p(e)), ()) for w, e in (
+    *((W - i, E + i) for i in reversed(range(1, Q_COUNT))), (W, E),
+    *((W + i, E - i) for i in range(1, Q_COUNT)))]
+  lines = tuple(np.stack(l) for l in zip(*lines))
+  # less than 16 operations with 2**-104 relative error on 2 * (X + Y)
+  return arcs, stack((*NORTH_P, *SOUTH_P), ()), lines, 2.0 ** -96 * sum(scale)
+
+DIGITS = decimal.Context(prec=mp.dps // 2, rounding=decimal.ROUND_HALF_EVEN)
+EXACT = decimal.Context(prec=mp.dps * 2)
+
+def fd(hi, lo, bound):
+  """ff() of a double-double value (None if the printed digits are not
+  the same for the whole error interval)"""
+  v = EXACT.add(decimal.Decimal(hi), decimal.Decimal(lo))
+  d = DIGITS.plus(EXACT.subtract(v, bound))
+  if d != DIGITS.plus(EXACT.add(v, bound)): return None
+  s = format(d, 'f')
+  if '.' not in s: return f'{s}.0'
+  s = s.rstrip('0')
+  return f'{s}0' if s.endswith('.') else s
+
+def fd_array(hi, lo, bound):
+  """fd() of double-double arrays, the digits are rounded in float64 (the
+  values near a power of ten or too small for that are left to fd())"""
+  n = mp.dps // 2
+  sign = np.sign(hi)
+  hi, lo = hi * sign, lo * sign
+  e = np.floor(np.log10(np.where(hi > 0, hi, 1))).astype(np.intp)
+  k = np.clip(n - 1 - e, 0, 22) # exact powers of ten
+  h, l = dd_mul((hi, lo), (10.0 ** k, np.zeros_like(hi)))
+  i = np.round(h)
+  f = (h - i) + l
+  j = np.round(f)
+  digits = i.astype(np.int64) + j.astype(np.int64)
+  near = np.abs(np.abs(f - j) - 0.5) <= bound * 10.0 ** k + 2.0 ** -20
+  near |= (hi == 0) | (k != n - 1 - e)
+  near |= (digits < 10 ** (n - 1)) | (digits >= 10 ** n)
+  s = []
+  for d, e, neg, near, h, l in zip(digits.tolist(), e.tolist(),
+      (sign < 0).tolist(), near.tolist(), hi.tolist(), lo.tolist()):
+    if near:
+      s.append(fd(-h if neg else h, -l if neg else l, decimal.Decimal(bound)))
+      continue
+    d = str(d)
+    d = f'{d[:e + 1]}.{d[e + 1:]}' if e >= 0 else f'0.{"0" * (-1 - e)}{d}'
+    d = d.rstrip('0')
+    s.append(('-' if neg else '') + (f'{d}0' if d.endswith('.') else d))
+  return tuple(s)
+
+def path_values(a_count, scale, exact=False, check_every=CHECK_EVERY):
+  """printed (arcs, mask, lines) values and the number of mpmath fallbacks,
+  the fast path falls back to mpmath for every arc/line with a value near
+  a rounding boundary and for everything if the sampled reference fails"""
+  if exact: return exact_values(a_count, scale), 0
+  arcs, mask, lines, bound = fast_values(a_count, scale)
+  values = fd_array(*(np.concatenate((a.ravel(), m, l.ravel()))
+    for a, m, l in zip(arcs, mask, lines)), bound)
+  ARCS = [values[n:n + 20] for n in range(0, 20 * a_count, 20)]
+  MASK = values[20 * a_count:20 * a_count + 4]
+  LINES = [values[n:n + 4] for n in range(20 * a_count + 4, len(values), 4)]
+  fallbacks = 0
+  for n, a in enumerate(ARCS):
+    if None in a:
+      ARCS[n] = tuple(map(ff, arc_values(a_count - 1 - n, a_count, scale)))
+      fallbacks += 1
+  if None in MASK:
+    MASK = tuple(map(ff, mask_values(scale)))
+    fallbacks += 1
+  for n, (w, e) in enumerate(latitudes()):
+    if None in LINES[n]:
+      LINES[n] = tuple(map(ff, line_values(w, e, scale)))
+      fallbacks += 1
+  for n in range(0, a_count, check_every):
+    ref = arc_values(a_count - 1 - n, a_count, scale)
+    if tuple(map(ff, ref)) != ARCS[n] or any(
+        abs(mp.mpf(float(h)) + mp.mpf(float(l)) - r) > bound
+        for h, l, r in zip(arcs[0][n], arcs[1][n], ref)):
+      print(f'warning: arc {n + 1} differs from mpmath, using mpmath',
+        file=sys.stderr)
+      return exact_values(a_count, scale), a_count + len(LINES) + 1
+  return (ARCS, MASK, LINES), fallbacks
+
+def svg_xml(b_width=B_WIDTH, sar_dar=(SAR_X, SAR_Y, DAR_X, DAR_Y),
+    p_color=P_COLOR, exact=False, check_every=CHECK_EVERY):
+  """ball path SVG (cmap base for GIMP) and the number of mpmath fallbacks"""
+  B_WIDTH = b_width
+  B_HEIGHT = b_height(B_WIDTH, *sar_dar)
+  P_COLOR = p_color
+  ANIM_LEN = len(P_COLOR) * 2 # * 2 fields/frame
+  A_COUNT = ANIM_LEN // 2 * Q_COUNT
+  with stagetime.stage('geometry', arcs=A_COUNT) as t:
+    (ARCS, MASK, LINES), fallbacks = path_values(A_COUNT,
+      (mp.mpf(B_WIDTH) / 2, mp.mpf(B_HEIGHT) / 2), exact, check_every)
+    t['fallbacks'] = fallbacks
+  xml = [
+    '<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n',
+    '<!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 1.0//EN"\n',
+    '\t"http://www.w3.org/TR/2001/REC-SVG-20010904/DTD/svg10.dtd">\n',
+    '<svg version="1.0" xmlns="http://www.w3.org/2000/svg"\n',
+    '\txmlns:xlink="http://www.w3.org/1999/xlink"\n',
+    f'\tviewBox="0 0 {B_WIDTH} {B_HEIGHT}"',
+    f' width="{B_WIDTH}px" height="{B_HEIGHT}px"',
+    ' preserveAspectRatio="xMinYMin">\n',
+    '\t<!-- disable path anti-aliasing in GIMP -->\n',
+    '\t<style type="text/css">path, rect {',
+    ' shape-rendering: crispEdges; }</style>\n',
+    '\t<defs>\n',
+    '\t\t<!-- binary channel filter (round to on/off) -->\n',
+    f'\t\t<filter id="f" x="0" y="0" width="{B_WIDTH}" height="{B_HEIGHT}">\n',
+    '\t\t\t<feComponentTransfer>\n',
+    '\t\t\t\t<feFuncR type="discrete" tableValues="0 1"/>\n',
+    '\t\t\t\t<feFuncG type="discrete" tableValues="0 1"/>\n',
+    '\t\t\t\t<feFuncB type="discrete" tableValues="0 1"/>\n',
+    '\t\t\t\t<feFuncA type="discrete" tableValues="0 1"/>\n',
+    '\t\t\t</feComponentTransfer>\n',
+    '\t\t</filter>\n',
+    f'\t\t<rect id="a" x="0" y="0" width="{B_WIDTH}" height="{B_HEIGHT}"/>\n',
+    '\t\t<!-- transformed arcs (GIMP does not tranform paths on import) -->\n']
+  # SVG arcs would be sufficient for PAR 1:1, but for height scaling we have
+  # to use cubic Bézier curves (GIMP converts the arcs during import anyway)
+  for n, values in enumerate(ARCS, 1):
+    xml.append((
+      '\t\t<path id="a{0:02d}" d="M {1},{2}\n' +
+      '\t\t\tC {3},{4}\n' +
+      '\t\t\t  {5},{6} {7},{8}\n' +
+      '\t\t\tS {9},{10} {11},{12}\n' +
+      '\t\t\tS {13},{14} {15},{16}\n' +
+      '\t\t\tS {17},{18} {19},{20}\n' +
+      '\t\t\tZ"/><clipPath id="c{0:02d}">' +
+      '<use xlink:href="#a{0:02d}"/></clipPath>\n').format(n, *values))
+  xml.append((
+    '\t\t<mask id="m">\n' +
+    '\t\t\t<path id="l" d="M {0},{1}\n' +
+    '\t\t\t\tV 0 H 0 V {2} H {3} V {4} Z" fill="white"/>\n' +
+    '\t\t</mask>\n' +
+    '\t</defs>\n').format(*MASK[0:2], B_HEIGHT, *MASK[2:4]))
+  xml.append(
+    '\t<!-- arc fill is only for illustration, can be ignored/deleted -->\n' +
+    '\t<g id="v" filter="url(#f)" mask="url(#m)">\n')
+  for i in range(A_COUNT):
+    xml.append((
+      '\t\t<use xlink:href="#a" clip-path="url(#c{0:02d})" fill="{1}"/>\n'
+      ).format(A_COUNT - i, 'black' if i & 1 else 'white'))
+  xml.append(
     '\t</g>\n' +
-    '\t<!-- pixel art rotate/invertible ({0} * 2) * 2 color palette -->\n' +
-    '\t<g id="p">\n').format(len(P_COLOR) // 2)
-  P_FRMT = (
-    '\t\t<rect id="{0}{1:X}" fill="#{4:03x}"' +
-    ' width="{0}" height="{0}"'.format(P_SIZE) +
-    ' y="{3}" x="{2}"/>\n')
-  for i in range(0, len(P_COLOR) // 2):
-    xml += P_FRMT.format('p', i + 1,
-      P_SIZE * (len(P_COLOR) // 2 - i - 1), P_SIZE * 0,
-      P_COLOR[i])
-  for i in range(0, len(P_COLOR) // 2):
-    xml += P_FRMT.format('i', len(P_COLOR) // 2 - i,
-      P_SIZE * (len(P_COLOR) // 2 - i - 1), P_SIZE * 1,
-      0xFFF & ~P_COLOR[len(P_COLOR) // 2 - i - 1])
-  for i in range(0, len(P_COLOR) // 2):
-    xml += P_FRMT.format('p', len(P_COLOR) // 2 + i + 1,
-      P_SIZE * (len(P_COLOR) // 2 - i - 1), P_SIZE * 2,
-      P_COLOR[len(P_COLOR) // 2 + i])
-  for i in range(0, len(P_COLOR) // 2):
-    xml += P_FRMT.format('i', len(P_COLOR) - i,
-      P_SIZE * (len(P_COLOR) // 2 - i - 1), P_SIZE * 3,
-      0xFFF & ~P_COLOR[len(P_COLOR) - i - 1])
-  xml += (
+    '\t<g id="h">\n')
+  for (name, values) in zip(
+      (*(f'n{i}' for i in reversed(range(1, Q_COUNT))), 'h0',
+        *(f's{i}' for i in range(1, Q_COUNT))), LINES):
+    xml.append(
+      '\t\t<path id="{0}" d="M {1},{2} L {3},{4} Z"/>\n'.format(name, *values))
+  xml.append(
     '\t</g>\n')
-xml += (
-  '</svg>\n')
+  if len(P_COLOR) == ANIM_LEN // 2:
+    P_SIZE = (3 * (6 * 2)) // len(P_COLOR)
+    xml.append((
+      '\t<!-- animation grayscale ({0} * 2) * 2 intensity levels -->\n' +
+      '\t<g id="g">\n').format(len(P_COLOR) // 2))
+    for i in reversed(range(0, len(P_COLOR) * 2)):
+      xml.append((
+        '\t\t<rect id="g{0:02d}" fill="#{3:02x}{3:02x}{3:02x}"' +
+        ' width="{0}" height="{0}"'.format(P_SIZE) +
+        ' y="{2}" x="{1}"/>\n').format(len(P_COLOR) * 2 - i,
+        B_WIDTH - P_SIZE - (
+          P_SIZE * ((len(P_COLOR) * 2 - i - 1) % (len(P_COLOR) // 2))),
+        P_SIZE * ((len(P_COLOR) * 2 - i - 1) // (len(P_COLOR) // 2)),
+        ((0xFF * 2 // 0x11 - i) * 0x11 + 2 // 2) // 2))
+    xml.append((
+      '\t</g>\n' +
+      '\t<!-- pixel art rotate/invertible ({0} * 2) * 2 color palette -->\n' +
+      '\t<g id="p">\n').format(len(P_COLOR) // 2))
+    P_FRMT = (
+      '\t\t<rect id="{0}{1:X}" fill="#{4:03x}"' +
+      ' width="{0}" height="{0}"'.format(P_SIZE) +
+      ' y="{3}" x="{2}"/>\n')
+    for i in range(0, len(P_COLOR) // 2):
+      xml.append(P_FRMT.format('p', i + 1,
+        P_SIZE * (len(P_COLOR) // 2 - i - 1), P_SIZE * 0,
+        P_COLOR[i]))
+    for i in range(0, len(P_COLOR) // 2):
+      xml.append(P_FRMT.format('i', len(P_COLOR) // 2 - i,
+        P_SIZE * (len(P_COLOR) // 2 - i - 1), P_SIZE * 1,
+        0xFFF & ~P_COLOR[len(P_COLOR) // 2 - i - 1]))
+    for i in range(0, len(P_COLOR) // 2):
+      xml.append(P_FRMT.format('p', len(P_COLOR) // 2 + i + 1,
+        P_SIZE * (len(P_COLOR) // 2 - i - 1), P_SIZE * 2,
+        P_COLOR[len(P_COLOR) // 2 + i]))
+    for i in range(0, len(P_COLOR) // 2):
+      xml.append(P_FRMT.format('i', len(P_COLOR) - i,
+        P_SIZE * (len(P_COLOR) // 2 - i - 1), P_SIZE * 3,
+        0xFFF & ~P_COLOR[len(P_COLOR) - i - 1]))
+    xml.append(
+      '\t</g>\n')
+  xml.append(
+    '</svg>\n')
+  return ''.join(xml), fallbacks
+
+# grey level of an animation step (see 'ballpath.gpl', 0 = background)
+step_gray = lambda i, anim_len : (
+  ((i + 0xFF * 2 // 0x11 + 1 - anim_len) * 0x11 + 2 // 2) // 2)
+
+EDGE = 2.0 ** -32 # radians, far above the float64 error of the samples
+
+def cmap_samples(width, height, anim_len, offsets):
+  """animation step (anim_len = background) at the pixel offsets (0..1),
+  shape (height, width, len(offsets) ** 2)"""
+  n = len(offsets)
+  x = np.add.outer(np.arange(width), offsets).ravel() * 2 / width - 1
+  y = 1 - np.add.outer(np.arange(height), offsets).ravel() * 2 / height
+  x, y = np.meshgrid(x, y)
+  r = float(R_ANGLE) # rotate back to the upright globe
+  x, y = x * np.cos(r) - y * np.sin(r), x * np.sin(r) + y * np.cos(r)
+  inside = x * x + y * y < 1
+  y = np.clip(y, -1, 1)
+  lon = np.arcsin(np.clip(x / np.sqrt(np.maximum(1 - y * y, 1e-300)), -1, 1))
+  lat = np.arcsin(y)
+  # the colors swap (+ anim_len // 2) on every line of latitude, samples
+  # exactly on a line (1:3 stairs) belong to the north/west side
+  step = (anim_len // 2 * (np.floor((lat + EDGE) / float(Q_ANGLE)) + 1)
+    - np.ceil((lon - EDGE) / float(mp.pi / 2 / (anim_len // 2 * Q_COUNT))))
+  step = np.where(inside, step % anim_len, anim_len).astype(np.intp)
+  return step.reshape(height, n, width, n).transpose(0, 2, 1, 3).reshape(
+    height, width, n * n)
 
-with open(PATH_FILE, 'w', encoding='ascii') as svg: svg.write(xml)
+def cmap_steps(b_width=B_WIDTH, sar_dar=(SAR_X, SAR_Y, DAR_X, DAR_Y),
+    p_color=P_COLOR, supersample=1):
+  """animation step of every pixel (-1 = background) without the SVG/GIMP
+  detour: the arcs are meridians every pi / 2 / A_COUNT and the lines of
+  latitude every Q_ANGLE (exact ellipses instead of the BEZIERK curves),
+  the pixel takes the step with the most of the n * n samples (n = 1 and
+  ties use the center, like the crispEdges import in GIMP)"""
+  B_HEIGHT = b_height(b_width, *sar_dar)
+  ANIM_LEN = len(p_color) * 2
+  steps = np.arange(ANIM_LEN + 1)
+  center = cmap_samples(b_width, B_HEIGHT, ANIM_LEN, (0.5,))
+  votes = (center == steps).astype(np.intp)
+  if supersample > 1:
+    votes += 2 * (cmap_samples(b_width, B_HEIGHT, ANIM_LEN,
+      (np.arange(supersample) + 0.5) / supersample)[..., None]
+      == steps).sum(axis=2)
+  step = votes.argmax(axis=-1)
+  return np.where(step == ANIM_LEN, -1, step)
 
+def cmap_png(steps, anim_len, cmap_file):
+  """8-bit greyscale cmap for ballanim.py"""
+  height, width = steps.shape
+  gray = np.where(steps < 0, 0, step_gray(steps, anim_len)).astype(np.uint8)
+  with open(cmap_file, 'wb') as f:
+    png.Writer(width, height, greyscale=True, bitdepth=8,
+      compression=9).write(f, gray)
+
+def main():
+  ratio = lambda x : tuple(map(int, x.split(':', 1)))
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--output',  metavar=f'.svg', type=pathlib.Path,
+    default=argparse.SUPPRESS, help=f'output filename (default={PATH_FILE})')
+  parser.add_argument('--ntsc', action='store_true',
+    default=False, help=f'generate a NTSC variant ({NTSC_FILE})')
+  parser.add_argument('--width', metavar='N', type=int,
+    default=B_WIDTH, help=f'ball width (default={B_WIDTH})')
+  parser.add_argument('--sar', metavar='X:Y', type=ratio,
+    default=argparse.SUPPRESS, help='storage aspect ratio (320:256/320:200)')
+  parser.add_argument('--dar', metavar='X:Y', type=ratio,
+    default=argparse.SUPPRESS, help='display aspect ratio (5:4/4:3)')
+  parser.add_argument('--exact', action='store_true',
+    default=False, help='compute everything with mpmath (slow reference)')
+  parser.add_argument('--check-every', metavar='N', type=int,
+    default=CHECK_EVERY, help=f'mpmath check of every N-th arc'
+      f' (default={CHECK_EVERY})')
+  parser.add_argument('--cmap-file', metavar='.png', type=pathlib.Path,
+    default=None, help='write a rasterized cmap instead of the SVG')
+  parser.add_argument('--supersample', metavar='N', type=int,
+    default=1, help='cmap samples per pixel and axis (default=1)')
+  stagetime.add_arguments(parser)
+  args = parser.parse_args()
+  stagetime.enable('ballpath', args.timings, args.profile)
+  path_file = args.output if hasattr(args, 'output') else (
+    NTSC_FILE if args.ntsc else PATH_FILE)
+  sar_dar = NTSC_SAR_DAR if args.ntsc else (SAR_X, SAR_Y, DAR_X, DAR_Y)
+  if hasattr(args, 'sar'): sar_dar = (*args.sar, *sar_dar[2:4])
+  if hasattr(args, 'dar'): sar_dar = (*sar_dar[0:2], *args.dar)
+  p_color = NTSC_COLOR if args.ntsc else P_COLOR
+  if args.cmap_file:
+    with stagetime.stage('render') as t:
+      steps = cmap_steps(args.width, sar_dar, p_color,
+        max(1, args.supersample))
+      t['pixels'] = steps.size
+    with stagetime.stage('png-encode', pixels=steps.size):
+      cmap_png(steps, len(p_color) * 2, args.cmap_file)
+  else:
+    with stagetime.stage('text-emit') as t:
+      xml, _ = svg_xml(args.width, sar_dar, p_color, args.exact,
+        max(1, args.check_every))
+      with open(path_file, 'w', encoding='ascii') as svg: svg.write(xml)
+      t['bytes'] = len(xml)
+  stagetime.save()
+
+if __name__ == '__main__':
+  main()
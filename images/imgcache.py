@@ -0,0 +1,169 @@
+# not-so-random quote: "i've seen this one before, it's a classic"
+
+import contextlib
+import hashlib
+import json
+import os
+import pathlib
+import tempfile
+
+try:
+  import fcntl # serializes the manifest updates of parallel make jobs
+except ImportError:
+  fcntl = None
+
+CACHE_DIR = '.imgcache' # relative to the working directory (images/)
+MANIFEST = 'manifest.json'
+LOCK = 'manifest.lock'
+UMASK = os.umask(0o022)
+os.umask(UMASK)
+
+# manifest file: entries as loaded (save() merges only the own changes)
+loaded = {}
+
+def hash_data(*parts):
+  """sha256 over str/bytes/buffer parts (None for an absent input)"""
+  h = hashlib.sha256()
+  for p in parts:
+    if p is None: p = b'\0'
+    elif isinstance(p, str): p = p.encode('utf-8')
+    p = memoryview(p).cast('B')
+    h.update(len(p).to_bytes(8, 'big'))
+    h.update(p)
+  return h.hexdigest()
+
+CHUNK_SIZE = 64 * 1024
+
+def hash_file(filename):
+  """content hash of a file ('' if it does not exist), same as hash_data()
+  of the contents without reading the whole file into memory"""
+  h = hashlib.sha256()
+  try:
+    with open(filename, 'rb') as f:
+      h.update(os.fstat(f.fileno()).st_size.to_bytes(8, 'big'))
+      while chunk := f.read(CHUNK_SIZE): h.update(chunk)
+  except FileNotFoundError:
+    return ''
+  return h.hexdigest()
+
+def add_arguments(argp_group):
+  argp_group.add_argument('--cache-dir', metavar='DIR', type=pathlib.Path,
+    help=f'incremental build cache (default={CACHE_DIR})', default=CACHE_DIR)
+  argp_group.add_argument('--no-cache', action='store_true',
+    help='ignore the cache and rewrite all outputs', default=False)
+
+def read_manifest(filename):
+  try:
+    with open(filename, 'r', encoding='ascii') as f:
+      return json.load(f)
+  except (FileNotFoundError, ValueError):
+    return {}
+
+@contextlib.contextmanager
+def locked(cache_dir):
+  """exclusive lock of the cache directory (between generator processes)"""
+  os.makedirs(cache_dir, exist_ok=True)
+  with open(os.path.join(cache_dir, LOCK), 'ab') as f:
+    if fcntl: fcntl.flock(f, fcntl.LOCK_EX)
+    yield # unlocked on close
+
+def load(cache_dir):
+  """manifest {name: {'inputs': hash, 'output': hash}} (None = disabled)"""
+  if cache_dir is None: return None
+  filename = os.path.join(cache_dir, MANIFEST)
+  manifest = read_manifest(filename)
+  loaded[filename] = dict(manifest)
+  return manifest
+
+def save(cache_dir, manifest):
+  """merge the entries recorded since load() into the manifest file (other
+  generators may have saved theirs in the meantime) and evict the blobs
+  that no entry uses anymore"""
+  if manifest is None: return
+  filename = os.path.join(cache_dir, MANIFEST)
+  base = loaded.get(filename, {})
+  with locked(cache_dir):
+    merged = read_manifest(filename)
+    merged.update((k, v) for k, v in manifest.items() if base.get(k) != v)
+    write_file(filename,
+      json.dumps(merged, indent=1, sort_keys=True).encode('ascii'))
+    evict(cache_dir, {b for e in merged.values() for b in e.get('blobs', ())})
+  manifest.update(merged)
+  loaded[filename] = dict(merged)
+
+def is_current(manifest, filename, inputs):
+  """output exists, is unmodified and was built from the same inputs"""
+  if manifest is None or filename not in manifest: return False
+  entry = manifest[filename]
+  return entry['inputs'] == inputs and entry['output'] == hash_file(filename)
+
+def record(manifest, filename, inputs, output, blobs=()):
+  """manifest entry of an output (with the keys of the blobs it was built
+  from, the other blobs are evicted by save())"""
+  if manifest is not None:
+    manifest[filename] = {'inputs': inputs, 'output': output,
+      **({'blobs': sorted(set(blobs))} if blobs else {})}
+
+def get_blob(cache_dir, key):
+  if cache_dir is None: return None
+  try:
+    with open(os.path.join(cache_dir, key[:2], key), 'rb') as f:
+      return f.read()
+  except FileNotFoundError:
+    return None
+
+def put_blob(cache_dir, key, data):
+  if cache_dir is None: return
+  os.makedirs(os.path.join(cache_dir, key[:2]), exist_ok=True)
+  write_file(os.path.join(cache_dir, key[:2], key), data)
+
+def temp_file(filename):
+  """(fd, name) of a new temporary file next to the file (unique per
+  process, so parallel writers never replace each other's file)"""
+  d, name = os.path.split(filename)
+  if d: os.makedirs(d, exist_ok=True)
+  fd, tmp = tempfile.mkstemp(prefix=f'{name}.', suffix='.tmp', dir=d or '.')
+  os.fchmod(fd, 0o666 & ~UMASK) # mkstemp creates 0600
+  return fd, tmp
+
+def evict(cache_dir, keep):
+  """remove the blobs that are not in keep (temporary files of running
+  put_blob() calls are left alone)"""
+  for d in os.scandir(cache_dir):
+    if not d.is_dir() or len(d.name) != 2: continue
+    for f in os.scandir(d.path):
+      if f.name in keep or f.name.endswith('.tmp'): continue
+      with contextlib.suppress(FileNotFoundError): os.remove(f.path)
+
+def write_file(filename, data, force=False):
+  """atomically replace the file if the contents differ (True if written)"""
+  try:
+    with open(filename, 'rb') as f:
+      if not force and f.read() == data: return False
+  except FileNotFoundError:
+    pass
+  fd, tmp = temp_file(filename)
+  try:
+    with os.fdopen(fd, 'wb') as f: f.write(data)
+    os.replace(tmp, filename)
+  except BaseException:
+    os.remove(tmp)
+    raise
+  return True
+
+def write_stream(filename, chunks, force=False):
+  """write_file() of an iterable of bytes chunks through a temporary file
+  (the contents are never held in memory), returns (written, hash)"""
+  fd, tmp = temp_file(filename)
+  try:
+    with os.fdopen(fd, 'wb') as f:
+      for chunk in chunks: f.write(chunk)
+    output = hash_file(tmp)
+    if not force and output == hash_file(filename):
+      os.remove(tmp)
+      return False, output
+    os.replace(tmp, filename)
+  except BaseException:
+    if os.path.exists(tmp): os.remove(tmp)
+    raise
+  return True, output
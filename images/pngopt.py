@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+
+# not-so-random quote: "size does matter"
+
+import argparse
+import heapq
+import imgcache
+import numpy as np
+import pathlib
+import png
+import sys
+import zlib
+
+FILTERS = 5 # none, sub, up, average, paeth
+# per-line filter selection (fixed type or heuristic, see filter_types())
+STRATEGIES = (0, 1, 2, 3, 4, 'minsum', 'entropy')
+# zlib settings (level, window bits, memory level, strategy)
+DEFLATE = tuple((9, 15, 9, s) for s in (
+  zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED, zlib.Z_RLE))
+CODE_HASH = imgcache.hash_file(__file__)
+
+def scanlines(p, bitdepth):
+  """(h, w) color indices as (h, bytes) packed palette lines"""
+  height, width = p.shape
+  ppb = 8 // bitdepth # pixels per byte
+  q = np.zeros((height, -(-width // ppb) * ppb), dtype=np.uint8)
+  q[:, :width] = p
+  q = q.reshape(height, -1, ppb)
+  return np.bitwise_or.reduce([q[..., k] << (8 - bitdepth * (k + 1))
+    for k in range(ppb)]).astype(np.uint8)
+
+def filter_lines(x):
+  """all filter types of every line as (FILTERS, h, bytes), the filters
+  predict from the unfiltered bytes (1 byte per pixel for palettes)"""
+  x = x.astype(np.int16)
+  a = np.pad(x, ((0, 0), (1, 0)))[:, :-1] # left
+  b = np.pad(x, ((1, 0), (0, 0)))[:-1] # up
+  c = np.pad(x, ((1, 0), (1, 0)))[:-1, :-1] # up left
+  pa, pb, pc = np.abs(b - c), np.abs(a - c), np.abs(a + b - 2 * c)
+  paeth = np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c))
+  return (np.stack((x, x - a, x - b, x - (a + b) // 2, x - paeth))
+    & 0xFF).astype(np.uint8)
+
+def filter_types(f, strategy):
+  """filter type of every line for a fixed type or a heuristic: minsum
+  (smallest sum of the signed residuals, libpng) or entropy (fewest bits
+  per line)"""
+  _, height, _ = f.shape
+  if isinstance(strategy, int):
+    return np.full(height, strategy, dtype=np.uint8)
+  if strategy == 'minsum':
+    return np.minimum(f, 256 - f.astype(np.int16)).sum(axis=2).argmin(axis=0)
+  if strategy == 'entropy':
+    counts = np.zeros((FILTERS, height, 256), dtype=np.intp)
+    np.add.at(counts, (np.arange(FILTERS)[:, None, None],
+      np.arange(height)[None, :, None], f), 1)
+    p = counts / f.shape[2]
+    bits = -(p * np.log2(np.where(p > 0, p, 1))).sum(axis=2)
+    return bits.argmin(axis=0)
+  raise ValueError(f'unknown filter strategy {strategy!r}')
+
+def filtered(f, types):
+  """raw IDAT data (filter type byte and filtered bytes per line)"""
+  lines = f[types, np.arange(f.shape[1])]
+  return np.concatenate((types.astype(np.uint8)[:, None], lines),
+    axis=1).tobytes()
+
+def compress(data, deflate):
+  """zlib stream of the data (deflate = level, window bits, memory level,
+  strategy)"""
+  z = zlib.compressobj(deflate[0], zlib.DEFLATED, *deflate[1:])
+  return z.compress(data) + z.flush()
+
+# deflate length (257..285) and distance (0..29) codes
+LENGTH_BASE = np.array((3, 4, 5, 6, 7, 8, 9, 10, 11, 13, 15, 17, 19, 23, 27,
+  31, 35, 43, 51, 59, 67, 83, 99, 115, 131, 163, 195, 227, 258))
+LENGTH_EXTRA = np.array((*(0,) * 8, *(n for n in range(1, 6) for _ in range(4)),
+  0))
+DIST_BASE = np.array((1, 2, 3, 4, 5, 7, 9, 13, 17, 25, 33, 49, 65, 97, 129,
+  193, 257, 385, 513, 769, 1025, 1537, 2049, 3073, 4097, 6145, 8193, 12289,
+  16385, 24577))
+DIST_EXTRA = np.array((0, 0, 0, 0,
+  *(n for n in range(1, 14) for _ in range(2))))
+CLEN_ORDER = (16, 17, 18, 0, 8, 7, 9, 6, 10, 5, 11, 4, 12, 3, 13, 2, 14, 1, 15)
+MAX_CHAIN = 64 # nearest earlier positions with the same 3 bytes
+WINDOW = 32768 # largest deflate distance
+ITERATIONS = 8 # cost model refinements
+CANDIDATES = 2 # best zlib filterings that get the optimal parse
+
+length_code = lambda n : np.searchsorted(LENGTH_BASE, n, side='right') - 1
+dist_code = lambda d : np.searchsorted(DIST_BASE, d, side='right') - 1
+
+def find_matches(x):
+  """per position the longest match and the nearest distance of every
+  match length 3..longest (at most WINDOW bytes back)"""
+  n, chains, matches = len(x), {}, []
+  key = ((x[:-2].astype(np.int32) << 16) | (x[1:-1].astype(np.int32) << 8)
+    | x[2:])
+  steps = np.arange(258)
+  for i in range(n):
+    m = min(258, n - i)
+    chain = chains.setdefault(int(key[i]), []) if i < n - 2 else []
+    js = np.array(chain[-1:-MAX_CHAIN - 1:-1], dtype=np.intp) # nearest first
+    js = js[js >= i - WINDOW]
+    if m < 3 or not len(js):
+      matches.append(None)
+    else:
+      eq = x[js[:, None] + steps[:m]] == x[i:i + m]
+      longest = np.maximum.accumulate(
+        np.where(eq.all(axis=1), m, eq.argmin(axis=1)))
+      if longest[-1] < 3: matches.append(None)
+      else: matches.append(
+        i - js[np.searchsorted(longest, np.arange(3, longest[-1] + 1))])
+    if i < n - 2: chain.append(i)
+  return matches
+
+def huffman_lengths(freq, limit):
+  """code lengths (<= limit) of the symbol frequencies, halving the
+  frequencies until the Huffman tree is flat enough"""
+  freq = np.asarray(freq, dtype=np.int64)
+  while True:
+    used = np.flatnonzero(freq)
+    lengths = np.zeros(len(freq), dtype=np.int64)
+    if len(used) == 1: lengths[used] = 1
+    if len(used) < 2: return lengths
+    heap = [(int(freq[s]), int(s), (int(s),)) for s in used]
+    heapq.heapify(heap)
+    while len(heap) > 1:
+      f1, k1, s1 = heapq.heappop(heap)
+      f2, k2, s2 = heapq.heappop(heap)
+      lengths[list(s1 + s2)] += 1
+      heapq.heappush(heap, (f1 + f2, min(k1, k2), s1 + s2))
+    if lengths.max() <= limit: return lengths
+    freq = np.where(freq > 0, (freq + 1) // 2, 0)
+
+def huffman_codes(lengths):
+  """canonical codes of the code lengths (bit reversed for the LSB-first
+  deflate bit order)"""
+  codes, code = np.zeros(len(lengths), dtype=np.int64), 0
+  for n in range(1, int(max(lengths.max(), 1)) + 1):
+    for s in np.flatnonzero(lengths == n):
+      codes[s] = int(f'{code:0{n}b}'[::-1], 2)
+      code += 1
+    code <<= 1
+  return codes
+
+def clen_runs(lengths):
+  """(symbol, extra bits, extra value) run-length codes of the code lengths
+  (16 repeats the previous length, 17/18 are zero runs)"""
+  runs, i = [], 0
+  while i < len(lengths):
+    v, n = int(lengths[i]), 1
+    while i + n < len(lengths) and lengths[i + n] == v: n += 1
+    i += n
+    if v:
+      runs.append((v, 0, 0))
+      n -= 1
+    while n:
+      if v == 0 and n >= 11: k = min(n, 138); runs.append((18, 7, k - 11))
+      elif v == 0 and n >= 3: k = min(n, 10); runs.append((17, 3, k - 3))
+      elif v and n >= 3: k = min(n, 6); runs.append((16, 2, k - 3))
+      else: k = 1; runs.append((v, 0, 0))
+      n -= k
+  return runs
+
+def write_bits(values):
+  """pack (value, bits) LSB first into bytes"""
+  out, acc, bits = bytearray(), 0, 0
+  for v, n in values:
+    acc |= int(v) << bits
+    bits += int(n)
+    while bits >= 8:
+      out.append(acc & 0xFF)
+      acc >>= 8
+      bits -= 8
+  if bits: out.append(acc)
+  return bytes(out)
+
+def deflate_block(x, path):
+  """zlib stream of a single dynamic Huffman block of the path (literal
+  byte or (length, distance) per step)"""
+  lit_freq = np.zeros(286, dtype=np.int64)
+  dist_freq = np.zeros(30, dtype=np.int64)
+  symbols = []
+  for step in path:
+    if isinstance(step, tuple):
+      n, d = step
+      lc, dc = int(length_code(n)), int(dist_code(d))
+      lit_freq[257 + lc] += 1
+      dist_freq[dc] += 1
+      symbols.append((257 + lc, n - LENGTH_BASE[lc], LENGTH_EXTRA[lc],
+        dc, d - DIST_BASE[dc], DIST_EXTRA[dc]))
+    else:
+      lit_freq[step] += 1
+      symbols.append((step,))
+  lit_freq[256] += 1
+  if not dist_freq.any(): dist_freq[0] = 1
+  lit_len = huffman_lengths(lit_freq, 15)
+  dist_len = huffman_lengths(dist_freq, 15)
+  lit_code, dist_code_ = huffman_codes(lit_len), huffman_codes(dist_len)
+  hlit = max(257, int(np.flatnonzero(lit_len).max()) + 1)
+  hdist = max(1, int(np.flatnonzero(dist_len).max()) + 1)
+  runs = clen_runs(np.concatenate((lit_len[:hlit], dist_len[:hdist])))
+  clen_len = huffman_lengths(np.bincount([r[0] for r in runs], minlength=19), 7)
+  clen_code = huffman_codes(clen_len)
+  hclen = max(4, max(i for i, s in enumerate(CLEN_ORDER) if clen_len[s]) + 1)
+  bits = [(1, 1), (2, 2), (hlit - 257, 5), (hdist - 1, 5), (hclen - 4, 4)]
+  bits += [(clen_len[s], 3) for s in CLEN_ORDER[:hclen]]
+  for s, n, v in runs: bits += [(clen_code[s], clen_len[s]), (v, n)]
+  for sym in symbols:
+    bits.append((lit_code[sym[0]], lit_len[sym[0]]))
+    if len(sym) > 1:
+      _, v, n, dc, dv, dn = sym
+      bits += [(v, n), (dist_code_[dc], dist_len[dc]), (dv, dn)]
+  bits.append((lit_code[256], lit_len[256]))
+  return (b'\x78\xda' + write_bits(bits)
+    + zlib.adler32(x.tobytes()).to_bytes(4, 'big'))
+
+def optimal_path(x, matches, lit_cost, len_cost, dist_cost):
+  """cheapest parse (literal or match per step) for the symbol costs"""
+  n = len(x)
+  cost = np.full(n + 1, np.inf)
+  back = np.zeros(n + 1, dtype=np.int64)
+  cost[0] = 0
+  extra_len = len_cost[length_code(np.arange(259))] + LENGTH_EXTRA[
+    length_code(np.arange(259))]
+  for i in range(n):
+    c = cost[i]
+    if c + lit_cost[x[i]] < cost[i + 1]:
+      cost[i + 1], back[i + 1] = c + lit_cost[x[i]], 1
+    d = matches[i]
+    if d is None: continue
+    dc = dist_code(d)
+    new = c + extra_len[3:3 + len(d)] + dist_cost[dc] + DIST_EXTRA[dc]
+    seg = cost[i + 3:i + 3 + len(d)]
+    better = new < seg
+    seg[better] = new[better]
+    back[i + 3:i + 3 + len(d)][better] = np.arange(3, 3 + len(d))[better]
+  path, j = [], n
+  while j > 0:
+    k = int(back[j])
+    if k == 1: path.append(int(x[j - 1]))
+    else: path.append((k, int(matches[j - k][k - 3])))
+    j -= k
+  return path[::-1]
+
+def symbol_costs(path):
+  """bits per literal/length and distance symbol of a parse"""
+  lit, dist = np.ones(286), np.ones(30) # smoothed frequencies
+  for step in path:
+    if isinstance(step, tuple):
+      lit[257 + length_code(step[0])] += 1
+      dist[dist_code(step[1])] += 1
+    else: lit[step] += 1
+  lit[256] += 1
+  return (np.log2(lit.sum()) - np.log2(lit),
+    np.log2(dist.sum()) - np.log2(dist))
+
+def deflate_optimal(data, iterations=ITERATIONS):
+  """smallest zlib stream of the iterated optimal parses (zopfli like, one
+  block), verified by decompressing it"""
+  x = np.frombuffer(data, dtype=np.uint8)
+  matches = find_matches(x)
+  lit, dist = np.full(286, 8.0), np.full(30, 5.0)
+  lit[257:] = 7
+  best = None
+  for _ in range(iterations):
+    path = optimal_path(x, matches, lit, lit[257:], dist)
+    z = deflate_block(x, path)
+    if best is None or len(z) < len(best): best = z
+    lit, dist = symbol_costs(path)
+  try:
+    if zlib.decompress(best) == data: return best
+  except zlib.error:
+    pass
+  return None
+
+def best_idat(p, bitdepth, strategies=STRATEGIES, deflate=DEFLATE,
+  candidates=CANDIDATES, iterations=ITERATIONS):
+  """smallest zlib stream of all filter strategies and deflate settings,
+  the best filterings are compressed again with the optimal parse"""
+  f = filter_lines(scanlines(p, bitdepth))
+  data = {filtered(f, filter_types(f, s)) for s in strategies}
+  tried = sorted(((min((compress(d, z) for z in deflate), key=len), d)
+    for d in data), key=lambda t : len(t[0]))
+  best = tried[0][0]
+  for _, d in tried[:candidates]:
+    z = deflate_optimal(d, iterations) if iterations else None
+    if z is not None and len(z) < len(best): best = z
+  return best
+
+def optimize_png(data, p):
+  """replace the IDAT of a palette PNG (of the (h, w) color indices p) with
+  the smallest one, all other chunks (PLTE/tRNS layout) are kept as is"""
+  chunks = list(png.Reader(bytes=data).chunks())
+  bitdepth = chunks[0][1][8]
+  idat = best_idat(p, bitdepth)
+  if len(idat) >= sum(len(c) for t, c in chunks if t == b'IDAT'): return data
+  chunks = [c for c in chunks if c[0] != b'IDAT']
+  chunks.insert(next(i for i, (t, _) in enumerate(chunks) if t == b'IEND'),
+    (b'IDAT', idat))
+  o = bytearray()
+  o += png.signature
+  for tag, c in chunks:
+    o += len(c).to_bytes(4, 'big') + tag + c
+    o += zlib.crc32(c, zlib.crc32(tag)).to_bytes(4, 'big')
+  return bytes(o)
+
+def main():
+  argp = argparse.ArgumentParser(prog='pngopt.py', add_help=True,
+    usage='python3 %(prog)s [--help] .png [.png ...]',
+    description='Optimize palette PNGs in place (only written if smaller,'
+      ' the pixels are verified).',
+    allow_abbrev=False)
+  argp.add_argument('files', metavar='.png', type=pathlib.Path, nargs='+')
+  args = argp.parse_args()
+  for filename in args.files:
+    data = filename.read_bytes()
+    width, height, pixels, metadata = png.Reader(bytes=data).read()
+    if 'palette' not in metadata:
+      sys.exit(f'error: {filename!s} is not a palette PNG')
+    p = np.array(tuple(pixels), dtype=np.uint8).reshape(height, width)
+    o = optimize_png(data, p)
+    _, _, pixels, _ = png.Reader(bytes=o).read()
+    if not np.array_equal(np.array(tuple(pixels), dtype=np.uint8), p):
+      sys.exit(f'error: {filename!s} pixels differ after optimizing')
+    if imgcache.write_file(filename, o):
+      print(f'{filename!s}: {len(data):d} -> {len(o):d} bytes')
+
+if __name__ == '__main__':
+  main()
@@ -2,7 +2,10 @@
 
 # not-so-random quote: "humor, seventy-five percent"
 
+import argparse
+import imgcache
 import png
+import stagetime
 import sys
 
 IMG_FILENAME = 'pointer.png'
@@ -12,31 +15,58 @@ PALETTE_RGB = ( # sprite 0 (pointer) and 1 (ball left) share the colors
   (0xF * 0x11, 0x0 * 0x11, 0x0 * 0x11, 255),
   (0xF * 0x11, 0xD * 0x11, 0xD * 0x11, 255),
   (0xF * 0x11, 0xF * 0x11, 0xF * 0x11, 255))
+CODE_HASH = imgcache.hash_file(__file__)
 
-width, height, pixels, metadata = png.Reader(filename=IMG_FILENAME).read()
-if (width > 16) or (height > 320 * 9 // 16):
-  sys.exit(f'error: pointer image has an invalid size')
-if 'palette' not in metadata:
-  sys.exit('error: pointer image has to be palette-based')
-palette = metadata['palette']
-if (len(palette) != 4):
-  sys.exit('error: pointer image has to contain 4 colors')
-try: # PNG writer/optimizer might reorder the palette colors
-  INDEX_COLOR = tuple(palette.index(c) for c in PALETTE_RGB)
-except ValueError:
-  sys.exit('error: pointer image palette color missmatch')
-
-code = '';
-for r in pixels:
-  spr0data = '%'
-  spr0datb = '%'
-  for i in r:
-    c = INDEX_COLOR[i]
-    spr0data += '01'[(c >> 0) & 0x01]
-    spr0datb += '01'[(c >> 1) & 0x01]
-  code += f'\t\tdc.w   \t{spr0data:0<17},{spr0datb:0<17}\n'
-
-with open(ASM_FILENAME, 'w', encoding='ascii') as f:
-  f.write(code)
-print(ASM_FILENAME)
+def asm_pointer(img_filename):
+  with stagetime.stage('png-decode') as t:
+    width, height, pixels, metadata = png.Reader(filename=img_filename).read()
+    pixels = tuple(pixels)
+    t['pixels'] = width * height
+  if (width > 16) or (height > 320 * 9 // 16):
+    sys.exit(f'error: pointer image has an invalid size')
+  if 'palette' not in metadata:
+    sys.exit('error: pointer image has to be palette-based')
+  palette = metadata['palette']
+  if (len(palette) != 4):
+    sys.exit('error: pointer image has to contain 4 colors')
+  try: # PNG writer/optimizer might reorder the palette colors
+    INDEX_COLOR = tuple(palette.index(c) for c in PALETTE_RGB)
+  except ValueError:
+    sys.exit('error: pointer image palette color missmatch')
 
+  with stagetime.stage('text-emit') as t:
+    code = '';
+    for r in pixels:
+      spr0data = '%'
+      spr0datb = '%'
+      for i in r:
+        c = INDEX_COLOR[i]
+        spr0data += '01'[(c >> 0) & 0x01]
+        spr0datb += '01'[(c >> 1) & 0x01]
+      code += f'\t\tdc.w   \t{spr0data:0<17},{spr0datb:0<17}\n'
+    t['bytes'] = len(code)
+  return code
+
+def main():
+  argp = argparse.ArgumentParser(prog='ptrdata.py', add_help=True,
+    usage='python3 %(prog)s [--help | options]',
+    description='Generate mouse pointer image data.',
+    allow_abbrev=False)
+  imgcache.add_arguments(argp)
+  stagetime.add_arguments(argp)
+  args = argp.parse_args()
+  stagetime.enable('ptrdata', args.timings, args.profile)
+  cache_dir = None if args.no_cache else args.cache_dir
+  manifest = imgcache.load(cache_dir)
+
+  inputs = imgcache.hash_data(CODE_HASH, imgcache.hash_file(IMG_FILENAME))
+  if not imgcache.is_current(manifest, ASM_FILENAME, inputs):
+    code = asm_pointer(IMG_FILENAME).encode('ascii')
+    if imgcache.write_file(ASM_FILENAME, code, manifest is None):
+      print(ASM_FILENAME)
+    imgcache.record(manifest, ASM_FILENAME, inputs, imgcache.hash_data(code))
+  imgcache.save(cache_dir, manifest)
+  stagetime.save()
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+# not-so-random quote: "trust, but verify"
+
+import argparse
+import io
+import numpy as np
+import png
+import re
+import sprdata
+import struct
+import sys
+import time
+
+# (empty line + lines) per frame and a trailing empty line (see sprdata.py)
+frame_rows = lambda ntsc : 1 + sprdata.img_height(ntsc)
+data_longs = lambda ntsc : sprdata.SPR_COUNT * (
+  2 * sprdata.img_count(ntsc) * frame_rows(ntsc) + 1)
+rom_basename = lambda ntsc : f'../cpubltro-{"ntsc" if ntsc else "pal"}.rom'
+
+def read_asm(asm_filename):
+  """longs of a dc.l/dcb.l sprite data file (sprdata.py output)"""
+  with open(asm_filename, 'r', encoding='ascii') as f:
+    text = f.read()
+  data = []
+  for count, value in re.findall(
+      r'^\t\tdcb\.l  \t(\d+),0|\$([0-9A-F]{8})\b', text, re.MULTILINE):
+    if count: data.extend((0,) * int(count))
+    else: data.append(int(value, 16))
+  return np.array(data, dtype=np.uint32)
+
+def read_bin(bin_filename):
+  """longs of a raw big-endian sprite data file (sprdata.py --binary)"""
+  return np.fromfile(bin_filename, dtype='>u4').astype(np.uint32)
+
+def read_rom(rom_filename, lst_filename, ntsc):
+  """longs of the sprite data inside a ROM image (memory-mapped, located
+  with the SprData/RomBase labels of the vasm listing)"""
+  try:
+    labels = sprdata.read_lst_labels(lst_filename)
+    offset = labels['SprData'] - labels['RomBase']
+  except (FileNotFoundError, KeyError):
+    sys.exit(f'error: {lst_filename}: SprData/RomBase not found (make first)')
+  rom = np.memmap(rom_filename, dtype=np.uint8, mode='r')
+  if len(rom) != sprdata.ROM_SIZE:
+    sys.exit(f'error: {rom_filename} has to be {sprdata.ROM_SIZE:d} bytes')
+  size = 4 * data_longs(ntsc)
+  if offset < 0 or offset + size > len(rom) - sprdata.ROM_FOOTER:
+    sys.exit(f'error: {lst_filename}: SprData is outside of the ROM')
+  return rom[offset:offset + size].view('>u4').astype(np.uint32)
+
+def decode_frames(data, ntsc):
+  """(frames, h, IMG_WIDTH) color indices of the sprite data longs and the
+  layout errors (missing empty lines), exits if the size does not match"""
+  if len(data) != data_longs(ntsc):
+    sys.exit(f'error: sprite data has {len(data):d} longs'
+      f' (expected {data_longs(ntsc):d})')
+  rows = data[:-sprdata.SPR_COUNT].reshape(
+    2 * sprdata.img_count(ntsc), frame_rows(ntsc), sprdata.SPR_COUNT)
+  errors = [f'frame {n:d} has no empty first line'
+    for n in np.flatnonzero(rows[:, 0].any(axis=1)).tolist()]
+  if data[-sprdata.SPR_COUNT:].any():
+    errors.append('sprite data has no empty last line')
+  return sprdata.unpack_sprites(rows[:, 1:]), errors
+
+def diff_frames(frames, images):
+  """(name, differing pixels, first differing line) of the frames that do
+  not match the (name, color indices) images"""
+  return [(f, int(d.sum()), int(d.any(axis=1).argmax()))
+    for (f, image), frame in zip(images, frames)
+    for d in (frame != image,) if d.any()]
+
+def png_chunks(writer, frame):
+  """(tag, data) chunks of a frame encoded as PNG"""
+  o = io.BytesIO()
+  writer.write(o, frame)
+  return list(png.Reader(bytes=o.getvalue()).chunks())
+
+def write_preview(png_filename, frames, fps):
+  """animated PNG of the decoded frames (one frame per display frame)"""
+  _, height, width = frames.shape
+  writer = png.Writer(size=(width, height), bitdepth=2,
+    palette=sprdata.PALETTE_RGB, compression=9)
+  chunks, seq = [], 0
+  for n, frame in enumerate(frames):
+    frame_chunks = png_chunks(writer, frame)
+    idat = b''.join(data for tag, data in frame_chunks if tag == b'IDAT')
+    if n == 0: # IHDR, animation control, PLTE and tRNS of the first frame
+      head = [c for c in frame_chunks if c[0] not in (b'IDAT', b'IEND')]
+      chunks += [head[0], (b'acTL', struct.pack('>II', len(frames), 0)),
+        *head[1:]]
+    chunks.append((b'fcTL', struct.pack('>IIIIIHHBB',
+      seq, width, height, 0, 0, 1, fps, 0, 0)))
+    if n == 0:
+      chunks.append((b'IDAT', idat))
+      seq += 1
+    else:
+      chunks.append((b'fdAT', struct.pack('>I', seq + 1) + idat))
+      seq += 2
+  chunks.append((b'IEND', b''))
+  with open(png_filename, 'wb') as f:
+    png.write_chunks(f, chunks)
+
+def main():
+  argp = argparse.ArgumentParser(prog='sprcheck.py', add_help=True,
+    usage='python3 %(prog)s (--pal | --ntsc | --help) [--rom | options]',
+    description='Decode the ball sprite data of a .i/.bin file or a ROM image'
+      ' and compare the frames with the (ball|ntsc)(west|east) images.',
+    allow_abbrev=False)
+  argp_mode = argp.add_argument_group('mode')
+  argp_ntsc = argp_mode.add_mutually_exclusive_group(required=True)
+  argp_ntsc.add_argument('--pal', action='store_false', dest='ntsc',
+    help='balldata.i / cpubltro-pal.rom')
+  argp_ntsc.add_argument('--ntsc', action='store_true',
+    help='ntscdata.i / cpubltro-ntsc.rom')
+  argp_mode.add_argument('--rom', action='store_true',
+    help='check the built ROM image (else the .i file)', default=False)
+  argp_opts = argp.add_argument_group('options')
+  argp_opts.add_argument('--data-file', metavar='.i|.bin',
+    help='sprite data file (default=(ball|ntsc)data.i)', default=None)
+  argp_opts.add_argument('--rom-file', metavar='.rom',
+    help='ROM image (default=../cpubltro-(pal|ntsc).rom)', default=None)
+  argp_opts.add_argument('--rom-lst', metavar='.lst',
+    help='listing of the ROM image (default=ROM file + .lst)', default=None)
+  argp_opts.add_argument('--preview', metavar='.png',
+    help='write the decoded frames as animated PNG', default=None)
+  args = argp.parse_args()
+
+  t = time.perf_counter()
+  if args.rom:
+    source = args.rom_file or f'{rom_basename(args.ntsc)}'
+    data = read_rom(source, args.rom_lst or f'{source}.lst', args.ntsc)
+  else:
+    source = args.data_file or f'{sprdata.img_basename(args.ntsc)}data.i'
+    data = (read_bin if source.endswith('.bin') else read_asm)(source)
+  frames, errors = decode_frames(data, args.ntsc)
+  t_decode = time.perf_counter() - t
+  images = [(f, load()) for f, _, load in sprdata.read_frames(args.ntsc)]
+  t = time.perf_counter()
+  errors += [f'{f}: {pixels:d} pixels differ (first line {line:d})'
+    for f, pixels, line in diff_frames(frames, images)]
+  t_diff = time.perf_counter() - t
+  if args.preview:
+    write_preview(args.preview, frames, 60 if args.ntsc else 50)
+    print(args.preview)
+  for e in errors: print(f'mismatch: {e}', file=sys.stderr)
+  print(f'{source}: {len(frames):d} frames decoded in {1000 * t_decode:.1f} ms,'
+    f' compared in {1000 * t_diff:.1f} ms', file=sys.stderr)
+  if errors: sys.exit(f'error: {len(errors):d} mismatch(es) in {source}')
+
+if __name__ == '__main__':
+  main()
@@ -3,66 +3,400 @@
 # not-so-random quote: "sure, but he had to die in the first place"
 
 import argparse
+import ballanim
+import imgcache
+import itertools
+import numpy as np
 import png
+import re
+import stagetime
 import sys
 
-argp = argparse.ArgumentParser(prog='sprdata.py', add_help=True,
-  usage='python3 %(prog)s (--pal | --ntsc | --help)',
-  description='Generate ball animation image data.',
-  allow_abbrev=False)
-argp_mode = argp.add_argument_group('mode')
-argp_ntsc = argp_mode.add_mutually_exclusive_group(required=True)
-argp_ntsc.add_argument('--pal', action='store_false', dest='ntsc',
-  help='50Hz (6*2 colors * 2/frame)')
-argp_ntsc.add_argument('--ntsc', action='store_true',
-  help='60Hz (7*2 colors * 2/frame)')
-args, _ = argp.parse_known_args()
-IMG_BASENAME = 'ntsc' if args.ntsc else 'ball'
-ASM_FILENAME = f'{IMG_BASENAME}data.i'
-IMG_FILEFRMT = f'{IMG_BASENAME}{{0}}/image{{1:03d}}.png'
-IMG_COUNT = 7*2*2 if args.ntsc else 6*2*2
+img_basename = lambda ntsc : 'ntsc' if ntsc else 'ball'
+img_count = lambda ntsc : 7*2*2 if ntsc else 6*2*2
+img_height = lambda ntsc : 93 if ntsc else 112
+IMG_FILEFRMT = '{0}{1}/image{2:03d}.png'
+IMG_DIRS = ('west', 'east')
+IMG_MASK_DIRS = (*IMG_DIRS, 'stop') # shadow mask (ballanim.py --mask-used)
+ROM_SIZE = 256*1024
+ROM_FOOTER = (2*4)+(8*2) # checksum, size, autovector indices
 IMG_WIDTH = 7*16
-IMG_HEIGHT = 93 if args.ntsc else 112
 PALETTE_RGB = (
   (0xA * 0x11, 0xA * 0x11, 0xA * 0x11, 0),
   (0xF * 0x11, 0x0 * 0x11, 0x0 * 0x11, 255),
   (0xF * 0x11, 0xD * 0x11, 0xD * 0x11, 255),
   (0xF * 0x11, 0xF * 0x11, 0xF * 0x11, 255))
+SPR_COUNT = IMG_WIDTH // 16
+SPR_SHIFT = np.arange(15, -1, -1, dtype=np.uint32)
+SPR_EMPTY = np.zeros((1, SPR_COUNT), dtype=np.uint32)
+CODE_HASH = imgcache.hash_file(__file__)
 
-def read_image(img_filename):
-  width, height, pixels, metadata = png.Reader(filename=img_filename).read()
-  if (width != IMG_WIDTH) or (height != IMG_HEIGHT):
-    sys.exit(f'{img_filename}: image has to be {IMG_WIDTH:d}x{IMG_HEIGHT:d} in size')
+def pack_sprites(colors):
+  """(..., IMG_WIDTH) color indices to (..., SPR_COUNT) SPRxDATA:SPRxDATB"""
+  with stagetime.stage('bit-pack', pixels=colors.size,
+      bytes=colors.size // 4):
+    c = colors.astype(np.uint32).reshape(*colors.shape[:-1], SPR_COUNT, 16)
+    SPRxDATA = (((c >> 0) & 0x01) << SPR_SHIFT).sum(axis=-1, dtype=np.uint32)
+    SPRxDATB = (((c >> 1) & 0x01) << SPR_SHIFT).sum(axis=-1, dtype=np.uint32)
+    return (SPRxDATA << 16) | SPRxDATB
+
+def unpack_sprites(data):
+  """(..., SPR_COUNT) SPRxDATA:SPRxDATB to (..., IMG_WIDTH) color indices"""
+  d = data.astype(np.uint32)[..., np.newaxis]
+  c = (((d >> (SPR_SHIFT + 16)) & 0x01) | (((d >> SPR_SHIFT) & 0x01) << 1))
+  return c.astype(np.uint8).reshape(*data.shape[:-1], IMG_WIDTH)
+
+def read_image(img_filename, img_height):
+  """palette-based PNG as (h, IMG_WIDTH) color indices"""
+  with stagetime.stage('png-decode') as t:
+    width, height, pixels, metadata = png.Reader(filename=img_filename).read()
+    pixels = np.array(tuple(pixels), dtype=np.intp)
+    t['pixels'] = pixels.size
+  if (width != IMG_WIDTH) or (height != img_height):
+    sys.exit(f'{img_filename}: image has to be {IMG_WIDTH:d}x{img_height:d} in size')
   if 'palette' not in metadata:
     sys.exit(f'{img_filename}: image has to be palette-based')
   palette = metadata['palette']
   if (len(palette) != 4):
     sys.exit(f'{img_filename}: image has to contain 4 colors')
   try: # PNG writer/optimizer might reorder the palette colors
-    INDEX_COLOR = tuple(palette.index(c) for c in PALETTE_RGB)
+    INDEX_COLOR = np.array(tuple(palette.index(c) for c in PALETTE_RGB))
   except ValueError:
     sys.exit(f'{img_filename}: image palette color missmatch')
-  code = f'\t\tdcb.l  \t7,0\t; {img_filename}\n'
-  for r in pixels:
-    d = []
-    for s in range(IMG_WIDTH // 16):
-      SPRxDATA = 0
-      SPRxDATB = 0
-      for i in range(16):
-        c = INDEX_COLOR[r[s * 16 + i]]
-        SPRxDATA = (SPRxDATA << 1) | ((c >> 0) & 0x01)
-        SPRxDATB = (SPRxDATB << 1) | ((c >> 1) & 0x01)
-      d.append((SPRxDATA << 16) | SPRxDATB)
-    code += f'\t\tdc.l   \t{','.join(f'${l:08X}' for l in d)}\n'
+  with stagetime.stage('palette-map', pixels=pixels.size):
+    return INDEX_COLOR[pixels]
+
+def read_frames(ntsc):
+  """(name, content hash, loader) of all (west, east) frames from the PNGs"""
+  base, height = img_basename(ntsc), img_height(ntsc)
+  names = (IMG_FILEFRMT.format(base, d, n)
+    for d in IMG_DIRS for n in range(img_count(ntsc)))
+  return [(f, imgcache.hash_file(f), lambda f=f : read_image(f, height))
+    for f in names]
+
+def cmap_frames(ntsc, cmap_file=None, write_png=False, manifest=None,
+    mask_file=None):
+  """(name, content hash, loader) of all (west, east) frames from the cmap
+  (and the stop frames if rendered with a shadow mask)"""
+  base, height = img_basename(ntsc), img_height(ntsc)
+  cmap = ballanim.read_cmap(cmap_file or f'{base}cmap.png')
+  if cmap.shape != (height, IMG_WIDTH):
+    sys.exit(f'error: cmap has to be {IMG_WIDTH:d}x{height:d} in size')
+  fade = ballanim.read_mask(mask_file, cmap) if mask_file else None
+  cmap = ballanim.map_intensity(cmap, ntsc, False)
+  frames = ballanim.render_frames(cmap, fade,
+    ballanim.anim_len(ntsc), ballanim.anim_base(), ballanim.ROT_FADER)
+  dirs = IMG_MASK_DIRS if mask_file else IMG_DIRS
+  if write_png:
+    frmt = lambda d : f'{base}{d}/{ballanim.FILE_FRMT}' if d in dirs else ''
+    ballanim.write_frames(frames, (frmt('east'), frmt('stop'), frmt('west')),
+      manifest=manifest)
+  directions = {'west': ballanim.WEST, 'east': ballanim.EAST,
+    'stop': ballanim.STOP}
+  colors = ((IMG_FILEFRMT.format(base, d, n), frames[directions[d], n])
+    for d in dirs for n in range(img_count(ntsc)))
+  return [(f, imgcache.hash_data(c), lambda c=c : c) for f, c in colors]
+
+ASM_DATAFRMT = f'\t\tdc.l   \t{','.join(('$%08X',) * SPR_COUNT)}\n'
+def asm_image(img_filename, data):
+  code = f'\t\tdcb.l  \t{SPR_COUNT:d},0\t; {img_filename}\n'
+  code += ''.join(ASM_DATAFRMT % tuple(r) for r in data.tolist())
   return code
+asm_trailer = lambda : f'\t\tdcb.l  \t{SPR_COUNT:d},0\n'.encode('ascii')
+
+bin_image = lambda data : (
+  np.concatenate((SPR_EMPTY, data)).astype('>u4').tobytes())
+bin_trailer = lambda : SPR_EMPTY.astype('>u4').tobytes()
+
+frame_key = lambda f, inputs, binary : (
+  imgcache.hash_data(CODE_HASH, 'bin' if binary else 'asm', f, inputs))
+
+def emit_frames(frames, binary=False, cache_dir=None):
+  """.i text or raw section of every frame (one frame in memory at a time),
+  packing only the frames without a cached section"""
+  for f, inputs, load in frames:
+    key = frame_key(f, inputs, binary)
+    section = imgcache.get_blob(cache_dir, key)
+    if section is None:
+      data = pack_sprites(load())
+      with stagetime.stage('text-emit') as t:
+        section = bin_image(data) if binary else (
+          asm_image(f, data).encode('ascii'))
+        t['bytes'] = len(section)
+      imgcache.put_blob(cache_dir, key, section)
+    yield section
+
+def write_data(filename, frames, binary=False, cache_dir=None, manifest=None):
+  """stream the sprite data file (untouched if already up to date)"""
+  inputs = imgcache.hash_data(
+    *(frame_key(f, i, binary) for f, i, _ in frames))
+  if imgcache.is_current(manifest, filename, inputs): return False
+  chunks = itertools.chain(emit_frames(frames, binary, cache_dir),
+    (bin_trailer() if binary else asm_trailer(),))
+  written, output = imgcache.write_stream(filename, chunks, manifest is None)
+  imgcache.record(manifest, filename, inputs, output,
+    (frame_key(f, i, binary) for f, i, _ in frames) if cache_dir else ())
+  return written
+
+def line_skip(data):
+  """leading zero longs and used longs per sprite line (of all frames)"""
+  used = np.any(np.stack(data) != 0, axis=0)
+  rows = used.any(axis=1)
+  lead = np.where(rows, used.argmax(axis=1), 0)
+  count = np.where(rows, SPR_COUNT - used[:, ::-1].argmax(axis=1) - lead, 0)
+  return lead, count
+
+def asm_line_skip(frames):
+  """sprite data without the outer zero longs of every line, with the
+  per-line offset (bytes) and skip/count (longs) tables for the ROM code,
+  every frame keeps its empty first line (DrwLine reads it outside the
+  ball) (returns the code and the size of the data in the ROM)"""
+  names = [f for f, _, _ in frames]
+  data = [pack_sprites(load()) for _, _, load in frames]
+  lead, count = line_skip(data)
+  offs = 4 * np.concatenate(([0], np.cumsum(count)[:-1]))
+  rows = lambda frmt, values, n : ''.join(
+    f'\t\t{frmt}\t{','.join(map(str, values[i:i + n]))}\n'
+    for i in range(0, len(values), n))
+  frame_size = 4 * (SPR_COUNT + int(count.sum()))
+  code = f'MY_SPRLSIZE\tEQU\t{frame_size:d}\t; bytes per frame\n'
+  code += 'SprLineOffs:\t\t; after the empty line\n'
+  code += rows('dc.w   ', offs.tolist(), 8)
+  code += 'SprLineSkip:\n' + rows('dc.b   ',
+    np.stack((lead, count), axis=1).ravel().tolist(), 16)
+  code += 'SprLineData:\n'
+  size = 2 * len(offs) + 2 * len(lead) + 4 * SPR_COUNT
+  code = [code]
+  for f, d in zip(names, data):
+    code.append(f'\t\tdcb.l  \t{SPR_COUNT:d},0\t; {f}\n')
+    code.extend(f'\t\tdc.l   \t{','.join(f'${v:08X}' for v in r[l:l + c])}\n'
+      for r, l, c in zip(d.tolist(), lead.tolist(), count.tolist()) if c)
+    size += frame_size
+  code.append(f'\t\tdcb.l  \t{SPR_COUNT:d},0\n')
+  return ''.join(code), size
+
+def delta_runs(prev, data):
+  """(first long, longs) runs of the changed longs from prev to data"""
+  changed = np.concatenate(([0], (prev != data).ravel(), [0])).astype(np.int8)
+  edges = np.flatnonzero(np.diff(changed))
+  return [(s, data.ravel()[s:e]) for s, e in zip(edges[0::2], edges[1::2])]
+
+def delta_encode(data):
+  """keyframe and per-frame delta runs of a frame loop as big-endian words
+  (dc.w runs, per run dc.w offset,longs-1 / dc.l longs) and asm code,
+  the last delta returns to the keyframe"""
+  blob = [data[0].astype('>u4').tobytes()]
+  code = [ASM_DATAFRMT % tuple(r) for r in data[0].tolist()]
+  for prev, d in zip(data, data[1:] + data[:1]):
+    runs = delta_runs(prev, d)
+    blob.append(np.array([len(runs)], dtype='>u2').tobytes())
+    code.append(f'\t\tdc.w   \t{len(runs):d}\n')
+    for i, r in runs:
+      blob.append(np.array([4 * i, len(r) - 1], dtype='>u2').tobytes())
+      blob.append(r.astype('>u4').tobytes())
+      code.append(f'\t\tdc.w   \t{4 * i:d},{len(r) - 1:d}\n')
+      code.append(
+        f'\t\tdc.l   \t{','.join(f'${v:08X}' for v in r.tolist())}\n')
+  return b''.join(blob), ''.join(code)
+
+def delta_decode(blob, count, shape):
+  """rebuild the count frames (and the keyframe again) from delta_encode()"""
+  size = shape[0] * shape[1]
+  frame = np.frombuffer(blob, dtype='>u4', count=size).astype(np.uint32)
+  frames, i = [frame.reshape(shape)], 4 * size
+  for _ in range(count):
+    frame = frame.copy()
+    runs, i = int.from_bytes(blob[i:i + 2], 'big'), i + 2
+    for _ in range(runs):
+      o, n = np.frombuffer(blob, dtype='>u2', count=2, offset=i).tolist()
+      frame[o // 4:o // 4 + n + 1] = np.frombuffer(blob, dtype='>u4',
+        count=n + 1, offset=i + 4)
+      i += 4 + 4 * (n + 1)
+    frames.append(frame.reshape(shape))
+  if i != len(blob): sys.exit('error: delta data size missmatch')
+  return frames
+
+def asm_delta(frames, ntsc):
+  """delta encoded sprite data of both directions, verified against the
+  PNG sources (returns the code and the size of the data in the ROM)"""
+  names = [f for f, _, _ in frames]
+  data = [pack_sprites(load()) for _, _, load in frames]
+  check = [pack_sprites(load()) for _, _, load in read_frames(ntsc)]
+  count = img_count(ntsc)
+  code, size = '', 0
+  for n in range(0, len(data), count):
+    blob, c = delta_encode(data[n:n + count])
+    decoded = delta_decode(blob, count, data[n].shape)
+    if not np.array_equal(decoded[0], decoded[-1]):
+      sys.exit(f'error: {names[n]}: delta loop does not return to keyframe')
+    for f, d, e in zip(names[n:n + count], decoded, check[n:n + count]):
+      if not np.array_equal(d, e):
+        sys.exit(f'error: {f}: delta decoded frame missmatch')
+    code += f'\t\tdcb.l  \t{SPR_COUNT:d},0\t; {names[n]} (keyframe)\n' + c
+    size += 4 * SPR_COUNT + len(blob)
+  code += f'\t\tdcb.l  \t{SPR_COUNT:d},0\n'
+  return code, size + 4 * SPR_COUNT
+
+def read_lst_labels(lst_filename):
+  """{label: address} of the global labels in a vasm listing file
+  (lea (label,pc) references win, -Lni hides the included data lines)"""
+  labels, refs, pending = {}, {}, []
+  with open(lst_filename, 'r', encoding='latin-1') as f:
+    for line in f:
+      addr, _, src = line.partition('\t')
+      label = re.match(r'\s*\d+: ([A-Za-z_]\w*):', src)
+      if label: pending.append(label.group(1))
+      addr = re.match(r'[0-9A-F]{2}:([0-9A-F]{8}) ([0-9A-F]{8})?', addr)
+      if not addr: continue
+      pc = int(addr.group(1), 16)
+      if pending:
+        labels.update((l, pc) for l in pending)
+        pending = []
+      ref = re.search(r'\blea\s+\((\w+),pc\)', src, re.IGNORECASE)
+      if ref and addr.group(2):
+        disp = int(addr.group(2)[4:], 16)
+        refs[ref.group(1)] = pc + 2 + disp - ((disp & 0x8000) << 1)
+  labels.update(refs)
+  return labels
+
+def asm_long_dict(frames):
+  """deduplicated sprite data longs of all frames (whole rows rarely repeat,
+  single longs do) and per-frame dc.w byte offset tables in the order of the
+  full layout (empty first line per frame, trailer), verified by rebuilding
+  the full layout (returns the code and the (name, bytes[, error]) sections,
+  no code if the dictionary is too large for dc.w offsets)"""
+  names = [f for f, _, _ in frames]
+  data = np.concatenate([x for _, _, load in frames
+    for x in (SPR_EMPTY, pack_sprites(load()))] + [SPR_EMPTY])
+  longs, index = np.unique(data, return_inverse=True)
+  sections = (
+    (f'long dictionary ({len(longs):d} longs)', 4 * len(longs)),
+    (f'long offset tables ({len(names):d} frames)', 2 * index.size))
+  if 4 * len(longs) > 0x8000:
+    return None, ((*sections[0], f'more than {0x8000 // 4:d} longs for dc.w'
+      ' offsets'), sections[1])
+  index = index.reshape(data.shape)
+  if not np.array_equal(longs[index], data):
+    sys.exit('error: long dictionary does not rebuild the sprite data')
+  height = (len(data) - 1) // len(names) # empty line and rows per frame
+  code = f'SprLongData:\t; {len(longs):d} unique longs\n'
+  values = [f'${v:08X}' for v in longs.tolist()]
+  code += ''.join(f'\t\tdc.l   \t{','.join(values[n:n + SPR_COUNT])}\n'
+    for n in range(0, len(values), SPR_COUNT))
+  code += 'SprLongIndex:\n'
+  for n, f in enumerate([*names, None]):
+    offs = (4 * index[n * height:(n + 1) * height if f else None]).ravel()
+    code += f'\t\t; {f}\n' if f else '\t\t; trailer\n'
+    code += ''.join(f'\t\tdc.w   \t{','.join(map(str, offs[k:k + 14]))}\n'
+      for k in range(0, len(offs), 14))
+  return code, sections
+
+def rom_budget(title, sections, lst_filename):
+  """print the ROM size breakdown (of (name, bytes[, error]) sections),
+  returns the error if a section failed or the sections do not fit"""
+  try:
+    labels = read_lst_labels(lst_filename)
+    code = labels['SprData'] - labels['RomBase']
+  except (FileNotFoundError, KeyError):
+    sys.exit(f'error: {lst_filename}: SprData/RomBase not found (make first)')
+  sections = (('ROM code/data before SprData', code), *sections,
+    ('ROM footer', ROM_FOOTER))
+  total = sum(n for _, n, *_ in sections)
+  print(f'{title} (ROM budget {ROM_SIZE:d} bytes):')
+  for name, n, *error in sections:
+    print(f'  {name:40s}{n:7d} bytes'
+      + ''.join(f' (failed: {e})' for e in error))
+  print(f'  {"total":40s}{total:7d} bytes ({ROM_SIZE - total:d} bytes free)')
+  for _, _, *error in sections:
+    if error: return f'error: {title}: {error[0]}'
+  if total > ROM_SIZE:
+    return f'error: {title} exceeds the ROM by {total - ROM_SIZE:d} bytes'
+  return None
 
-code = ''
-for d in ('west', 'east'):
-  for n in range(IMG_COUNT):
-    code += read_image(IMG_FILEFRMT.format(d, n))
-code += '\t\tdcb.l  \t7,0\n'
+def main():
+  argp = argparse.ArgumentParser(prog='sprdata.py', add_help=True,
+    usage='python3 %(prog)s (--pal | --ntsc | --help) [--binary] [--cmap]',
+    description='Generate ball animation image data.',
+    allow_abbrev=False)
+  argp_mode = argp.add_argument_group('mode')
+  argp_ntsc = argp_mode.add_mutually_exclusive_group(required=True)
+  argp_ntsc.add_argument('--pal', action='store_false', dest='ntsc',
+    help='50Hz (6*2 colors * 2/frame)')
+  argp_ntsc.add_argument('--ntsc', action='store_true',
+    help='60Hz (7*2 colors * 2/frame)')
+  argp_mode.add_argument('--binary', action='store_true',
+    help='raw big-endian data for INCBIN (else dc.l)', default=False)
+  argp_mode.add_argument('--cmap', action='store_true',
+    help='render frames from (ball|ntsc)cmap.png (else PNGs)', default=False)
+  argp_mode.add_argument('--write-png', action='store_true',
+    help='also write the --cmap frames (ballanim.py)', default=False)
+  argp_mode.add_argument('--line-skip', action='store_true',
+    help='line-skip layout (ball|ntsc)skip.i (not used yet)', default=False)
+  argp_mode.add_argument('--delta', action='store_true',
+    help='delta encoded (ball|ntsc)delta.i (not used yet)', default=False)
+  argp_mode.add_argument('--long-dict', action='store_true',
+    help='deduplicated longs (ball|ntsc)dict.i (not used yet)', default=False)
+  argp_mode.add_argument('--mask-file', metavar='.png',
+    help='--cmap with shadow mask (adds the stop frames)', default=None)
+  argp_mode.add_argument('--rom-lst', metavar='.lst',
+    help='listing for the --long-dict ROM budget check', default=None)
+  imgcache.add_arguments(argp_mode)
+  stagetime.add_arguments(argp_mode)
+  args = argp.parse_args()
+  stagetime.enable('sprdata', args.timings, args.profile)
+  if args.write_png and not args.cmap:
+    argp.error('--write-png requires --cmap')
+  if args.line_skip + args.delta + args.long_dict > 1:
+    argp.error('--line-skip, --delta and --long-dict are exclusive')
+  if (args.line_skip or args.delta or args.long_dict) and args.binary:
+    argp.error('--line-skip/--delta/--long-dict are only available as dc.l')
+  if args.mask_file and not (args.cmap and args.long_dict):
+    argp.error('--mask-file requires --cmap and --long-dict')
+  IMG_BASENAME = img_basename(args.ntsc)
+  ASM_FILENAME = f'{IMG_BASENAME}data.i'
+  BIN_FILENAME = f'{IMG_BASENAME}data.bin'
+  LSK_FILENAME = f'{IMG_BASENAME}skip.i'
+  DLT_FILENAME = f'{IMG_BASENAME}delta.i'
+  DCT_FILENAME = f'{IMG_BASENAME}dict.i'
+  ROM_LSTFILE = args.rom_lst or (
+    f'../cpubltro-{"ntsc" if args.ntsc else "pal"}.rom.lst')
 
-with open(ASM_FILENAME, 'w', encoding='ascii') as f:
-  f.write(code)
-print(ASM_FILENAME)
+  cache_dir = None if args.no_cache else args.cache_dir
+  manifest = imgcache.load(cache_dir)
+  if args.cmap:
+    frames = cmap_frames(args.ntsc, write_png=args.write_png, manifest=manifest,
+      mask_file=args.mask_file)
+  else:
+    frames = read_frames(args.ntsc)
+  if args.long_dict:
+    mode = f'{"NTSC" if args.ntsc else "PAL"}'
+    full = 4 * SPR_COUNT * (len(frames) * (1 + img_height(args.ntsc)) + 1)
+    errors = [rom_budget(f'{mode} full layout', (('sprite data', full),),
+      ROM_LSTFILE)]
+    code, sections = asm_long_dict(frames)
+    errors.append(rom_budget(f'{mode} long dictionary layout', sections,
+      ROM_LSTFILE))
+    for e in errors:
+      if e: sys.exit(e)
+    if imgcache.write_file(DCT_FILENAME, code.encode('ascii'), True):
+      print(DCT_FILENAME)
+  elif args.line_skip or args.delta:
+    if args.line_skip:
+      f, name = LSK_FILENAME, 'line-skip'
+      code, size = asm_line_skip(frames)
+    else:
+      f, name = DLT_FILENAME, 'delta'
+      code, size = asm_delta(frames, args.ntsc)
+    if imgcache.write_file(f, code.encode('ascii'), True): print(f)
+    full = 4 * SPR_COUNT * (len(frames) * (1 + img_height(args.ntsc)) + 1)
+    print(f'{"NTSC" if args.ntsc else "PAL"} sprite data: {full:d} bytes,'
+      f' {name} {size:d} bytes ({full - size:d} bytes saved,'
+      f' ratio {full / size:.2f}:1)')
+  else:
+    f = BIN_FILENAME if args.binary else ASM_FILENAME
+    if write_data(f, frames, args.binary, cache_dir, manifest): print(f)
+  imgcache.save(cache_dir, manifest)
+  stagetime.save()
 
+if __name__ == '__main__':
+  main()
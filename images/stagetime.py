@@ -0,0 +1,70 @@
+# not-so-random quote: "time is an illusion, lunchtime doubly so"
+
+import contextlib
+import cProfile
+import json
+import os
+import pathlib
+import sys
+import time
+
+# per-process recorder (None = disabled, the stages cost nothing)
+recorder = None
+
+def add_arguments(argp_group):
+  argp_group.add_argument('--timings', metavar='.jsonl', type=pathlib.Path,
+    help='append a JSON record per stage (- = stderr)', default=None)
+  argp_group.add_argument('--profile', metavar='DIR', type=pathlib.Path,
+    help='cProfile dump per stage (DIR/script-stage.prof)', default=None)
+
+def enable(script, timings=None, profile=None):
+  """start recording the stages of the script (if timings or profile)"""
+  global recorder
+  if timings is None and profile is None: return
+  recorder = {'script': script, 'timings': timings, 'profile': profile,
+    'date': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    'stages': {}, 'profiles': {}, 'nested': []}
+
+@contextlib.contextmanager
+def stage(name, **counts):
+  """time the block without the nested stages (profiled as part of the
+  outermost stage), the counts (pixels, bytes, files) of the yielded
+  record can be set inside, repeated stages are summed up (calls)"""
+  record = dict(counts)
+  if recorder is None:
+    yield record
+    return
+  nested = recorder['nested']
+  profile = None
+  if recorder['profile'] is not None and not nested:
+    profile = recorder['profiles'].setdefault(name, cProfile.Profile())
+  nested.append(0.0)
+  t = time.perf_counter()
+  if profile: profile.enable()
+  try:
+    yield record
+  finally:
+    if profile: profile.disable()
+    t = time.perf_counter() - t
+    inner = nested.pop()
+    if nested: nested[-1] += t
+    total = recorder['stages'].setdefault(name, {'time': 0.0, 'calls': 0})
+    total['time'] += t - inner
+    total['calls'] += 1
+    for k, v in record.items(): total[k] = total.get(k, 0) + int(v)
+
+def save():
+  """append the stage records (JSON lines) and write the profile dumps"""
+  if recorder is None: return
+  script = recorder['script']
+  lines = ''.join(json.dumps({'script': script, 'stage': name,
+    'date': recorder['date'], **r, 'time': round(r['time'], 6)}) + '\n'
+    for name, r in recorder['stages'].items())
+  if recorder['timings'] is None: pass
+  elif str(recorder['timings']) == '-': sys.stderr.write(lines)
+  else:
+    with open(recorder['timings'], 'a', encoding='ascii') as f: f.write(lines)
+  if recorder['profile'] is not None:
+    os.makedirs(recorder['profile'], exist_ok=True)
+    for name, p in recorder['profiles'].items():
+      p.dump_stats(os.path.join(recorder['profile'], f'{script}-{name}.prof'))
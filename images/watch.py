@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+# not-so-random quote: "i am always watching"
+
+import argparse
+import imgcache
+import os
+import png
+import ptrdata
+import sprdata
+import sys
+import time
+
+# (source, update function) of the watched sources
+targets = lambda : [
+  *((f'{sprdata.img_basename(ntsc)}cmap.png',
+    lambda state, manifest, ntsc=ntsc : update_sprites(state, ntsc, manifest))
+    for ntsc in (False, True)),
+  (ptrdata.IMG_FILENAME, update_pointer)]
+
+def file_stamp(filename):
+  """(mtime, size) of a file (None if it does not exist)"""
+  try:
+    s = os.stat(filename)
+  except FileNotFoundError:
+    return None
+  return s.st_mtime_ns, s.st_size
+
+def update_sprites(state, ntsc, manifest):
+  """render the cmap frames and pack/emit only the frames that differ from
+  the last update (the .i section of every frame is kept in memory and
+  in the sprdata.py blob cache), returns the output and the number of
+  changed frames"""
+  filename = f'{sprdata.img_basename(ntsc)}data.i'
+  frames = sprdata.cmap_frames(ntsc, write_png=state['write_png'],
+    manifest=manifest)
+  sections = state.setdefault('sections', {})
+  keys = [sprdata.frame_key(f, i, False) for f, i, _ in frames]
+  changed = 0
+  for (f, inputs, load), key in zip(frames, keys):
+    if sections.get(f, (None, b''))[0] == inputs: continue
+    sections[f] = (inputs,
+      sprdata.asm_image(f, sprdata.pack_sprites(load())).encode('ascii'))
+    imgcache.put_blob(state['cache_dir'], key, sections[f][1])
+    changed += 1
+  if changed:
+    data = b''.join(sections[f][1] for f, _, _ in frames)
+    data += sprdata.asm_trailer()
+    if imgcache.write_file(filename, data): state['written'] = True
+    imgcache.record(manifest, filename, imgcache.hash_data(*keys),
+      imgcache.hash_data(data), keys if state['cache_dir'] else ())
+  return filename, changed
+
+def update_pointer(state, manifest):
+  """emit the pointer data (a single small image)"""
+  filename = ptrdata.ASM_FILENAME
+  data = ptrdata.asm_pointer(ptrdata.IMG_FILENAME).encode('ascii')
+  if imgcache.write_file(filename, data): state['written'] = True
+  imgcache.record(manifest, filename, imgcache.hash_data(ptrdata.CODE_HASH,
+    imgcache.hash_file(ptrdata.IMG_FILENAME)), imgcache.hash_data(data))
+  return filename, 1
+
+def update(source, state, manifest, update_target):
+  """run the update of a changed source, errors (e.g. a half-written
+  PNG) are reported and retried on the next change"""
+  t = time.perf_counter()
+  state['written'] = False
+  try:
+    filename, changed = update_target(state, manifest)
+  except (SystemExit, png.Error, OSError, ValueError) as e:
+    print(f'{source}: {e}', file=sys.stderr)
+    return False
+  if state['written']:
+    print(f'{filename} ({changed:d} changed,'
+      f' {1000 * (time.perf_counter() - t):.1f} ms)', flush=True)
+  return True
+
+def watch(interval, write_png=False, once=False, cache_dir=None):
+  """poll the sources and update the outputs of the changed ones (a file
+  that is still being written fails to decode and its next (mtime, size)
+  triggers the update again)"""
+  manifest = imgcache.load(cache_dir)
+  states = {source: {'write_png': write_png, 'cache_dir': cache_dir}
+    for source, _ in targets()}
+  done = {}
+  while True:
+    for source, update_target in targets():
+      stamp = file_stamp(source)
+      if stamp is None or done.get(source) == stamp: continue
+      if update(source, states[source], manifest, update_target):
+        imgcache.save(cache_dir, manifest)
+      done[source] = stamp
+    if once: return
+    time.sleep(interval)
+
+def main():
+  argp = argparse.ArgumentParser(prog='watch.py', add_help=True,
+    usage='python3 %(prog)s [--help | options]',
+    description='Watch (ball|ntsc)cmap.png and pointer.png and update the'
+      ' (ball|ntsc)data.i and ptrdata.i on every change.',
+    allow_abbrev=False)
+  argp.add_argument('--interval', metavar='SECONDS', type=float,
+    help='polling interval (default=0.05)', default=0.05)
+  argp.add_argument('--write-png', action='store_true',
+    help='also write the changed frames (ballanim.py)', default=False)
+  argp.add_argument('--once', action='store_true',
+    help='update all outputs once and exit', default=False)
+  imgcache.add_arguments(argp)
+  args = argp.parse_args()
+  try:
+    watch(args.interval, args.write_png, args.once,
+      None if args.no_cache else args.cache_dir)
+  except KeyboardInterrupt:
+    pass
+
+if __name__ == '__main__':
+  main()